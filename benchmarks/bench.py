@@ -0,0 +1,268 @@
+"""Benchmark generation and rendering across resolution presets.
+
+Every case runs with a fixed seed in a fresh interpreter, so timings and
+memory do not leak between cases. For each case the fastest and median of
+``--repeat`` runs are reported together with peak memory: the growth of the
+process' maximum resident set size (which includes image buffers) and the
+peak of allocations traced by ``tracemalloc`` in one extra run.
+
+Run from the repository root::
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --baseline bench.json
+
+With ``--baseline`` the exit status is 1 when a case got slower or used
+more memory than the baseline by more than ``--tolerance``.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mapmaker import generator as mg
+
+SEED = 1234
+PRESETS = ("1080p", "4k", "8k")
+COUNTS = (10, 1000, 10000, 100000)
+# Uniform random placement retries every building up to 1000 times once the
+# canvas is full, so it is only timed for counts that fit.
+RANDOM_PLACEMENT_MAX = 1000
+DISTRICT_COUNTS = (10, 100)
+WALL_COUNTS = (1, 5)
+ROAD_POINT_COUNTS = (10, 1000, 10000)
+
+
+def _points(count, width, height):
+    import numpy as np
+
+    rng = np.random.default_rng(SEED)
+    return rng.uniform((0, 0), (width, height), size=(count, 2))
+
+
+def _png_setup(width, height, count):
+    from mapmaker.render import render_image
+
+    data = mg.generate_map_data(width, height, count, num_districts=10, placement="batch", seed=SEED)
+    return render_image(data, width, height)
+
+
+def _png_encode(img):
+    img.save(io.BytesIO(), "PNG")
+
+
+def _draw_map(width, height, count):
+    with tempfile.TemporaryDirectory() as tmp:
+        mg.draw_map(
+            os.path.join(tmp, "map.png"),
+            width,
+            height,
+            count,
+            num_districts=10,
+            placement="free",
+            seed=SEED,
+        )
+
+
+def cases(presets=PRESETS, counts=COUNTS):
+    """Return ``{name: (setup, run)}``; ``run`` gets what ``setup`` returns."""
+    result = {}
+    for preset in presets:
+        width, height = mg.RESOLUTION_PRESETS[preset]
+        for count in counts:
+            for placement in mg.PLACEMENT_MODES:
+                if placement == "random" and count > RANDOM_PLACEMENT_MAX:
+                    continue
+                result[f"generate_buildings/{placement}/{preset}/{count}"] = (
+                    lambda: None,
+                    lambda _, w=width, h=height, c=count, p=placement: mg.generate_buildings(
+                        w, h, c, placement=p, seed=SEED
+                    ),
+                )
+            result[f"draw_map/{preset}/{count}"] = (
+                lambda: None,
+                lambda _, w=width, h=height, c=count: _draw_map(w, h, c),
+            )
+            result[f"png_encode/{preset}/{count}"] = (
+                lambda w=width, h=height, c=count: _png_setup(w, h, c),
+                _png_encode,
+            )
+        for count in DISTRICT_COUNTS:
+            for mode in mg.DISTRICT_MODES:
+                result[f"generate_districts/{mode}/{preset}/{count}"] = (
+                    lambda: None,
+                    lambda _, w=width, h=height, c=count, m=mode: mg.generate_districts(
+                        w, h, c, seed=SEED, mode=m
+                    ),
+                )
+        for count in WALL_COUNTS:
+            result[f"generate_walls/{preset}/{count}"] = (
+                lambda: None,
+                lambda _, w=width, h=height, c=count: mg.generate_walls(w, h, c, seed=SEED),
+            )
+        for count in ROAD_POINT_COUNTS:
+            result[f"generate_road_network/{preset}/{count}"] = (
+                lambda w=width, h=height, c=count: _points(c, w, h),
+                lambda points, w=width, h=height: _road_network(points, w, h),
+            )
+    return result
+
+
+def _road_network(points, width, height):
+    from mapmaker.roads import generate_road_network
+
+    generate_road_network(points, width, height)
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def _preload():
+    # Import everything lazily loaded by the cases up front, so module
+    # imports count neither towards the first run nor its memory.
+    for module in ("mapmaker.districts", "mapmaker.render", "mapmaker.roads", "mapmaker.vectorized"):
+        importlib.import_module(module)
+
+
+def run_case(name, repeat, presets=PRESETS, counts=COUNTS):
+    """Time one case in this process and return its record."""
+    setup, run = cases(presets, counts)[name]
+    _preload()
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        arg = setup()
+        rss_before = _max_rss_mb()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(arg)
+            times.append(time.perf_counter() - start)
+        rss_after = _max_rss_mb()
+        tracemalloc.start()
+        run(arg)
+        traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    record = {
+        "seconds": round(min(times), 6),
+        "median_seconds": round(statistics.median(times), 6),
+        "traced_mb": round(traced / (1 << 20), 3),
+    }
+    if rss_before is not None:
+        record["rss_mb"] = round(rss_after - rss_before, 3)
+    return record
+
+
+def run_isolated(name, repeat, presets, counts):
+    """Run one case in a fresh interpreter and return its record."""
+    proc = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--run-case",
+            name,
+            "--repeat",
+            str(repeat),
+            "--presets",
+            *presets,
+            "--counts",
+            *map(str, counts),
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of ``results`` against ``baseline`` records."""
+    regressions = []
+    for name, record in results.items():
+        base = baseline.get(name)
+        if not base or "error" in record or "error" in base:
+            continue
+        for key in ("seconds", "rss_mb", "traced_mb"):
+            if key not in record or key not in base:
+                continue
+            # Ignore noise on very small values.
+            floor = 0.001 if key == "seconds" else 1.0
+            if record[key] > max(base[key], floor) * (1 + tolerance):
+                regressions.append((name, key, base[key], record[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark map generation and rendering")
+    parser.add_argument("--filter", help="only run cases whose name contains this text")
+    parser.add_argument("--presets", nargs="+", choices=PRESETS, default=list(PRESETS), help="presets to sweep")
+    parser.add_argument("--counts", nargs="+", type=int, default=list(COUNTS), help="building counts to sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare against results written earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or growth, as a fraction")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.repeat, args.presets, args.counts)))
+        return 0
+
+    names = [name for name in cases(args.presets, args.counts) if not args.filter or args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["results"]
+
+    results = {}
+    for name in names:
+        record = run_isolated(name, args.repeat, args.presets, args.counts)
+        results[name] = record
+        if "error" in record:
+            print(f"{name:<45} {record['error']}")
+            continue
+        line = f"{name:<45} {record['seconds']:10.4f} s  {record.get('rss_mb', 0):8.1f} MB rss  {record['traced_mb']:8.1f} MB traced"
+        base = baseline.get(name)
+        if base and "seconds" in base:
+            line += f"  x{record['seconds'] / max(base['seconds'], 1e-9):.2f}"
+        print(line)
+
+    if args.output:
+        meta = {"python": sys.version.split()[0], "platform": sys.platform, "seed": SEED, "repeat": args.repeat}
+        with open(args.output, "w") as fh:
+            json.dump({"meta": meta, "results": results}, fh, indent=2)
+
+    failures = sum(1 for record in results.values() if "error" in record)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, key, before, after in regressions:
+        print(f"regression: {name} {key} {before} -> {after}")
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Check that headless entry points stay cheap to import.
+
+Each entry point is imported in a fresh interpreter with ``-X importtime``.
+The check fails if a heavy optional module is pulled in, or if the total
+import time exceeds ``--max-ms`` when that option is given.
+
+Run from the repository root::
+
+    python benchmarks/check_imports.py
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points and the modules importing them must not load.
+CHECKS = [
+    ("import mapmaker", ("tkinter", "scipy", "numpy")),
+    ("import mapmaker.generator", ("tkinter", "scipy", "numpy")),
+    ("import mapmaker.batch", ("tkinter", "scipy", "numpy")),
+    ("import mapmaker.render", ("tkinter", "scipy")),
+]
+
+
+def profile(statement):
+    """Return ``(modules, total_us)`` for ``statement`` in a fresh process."""
+    code = f"{statement}\nimport sys\nprint('\\n'.join(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line.split("|")
+        # Only top-level imports, so nested ones are not counted twice.
+        if not fields[2].startswith(" ") or fields[2][1:2] == " ":
+            continue
+        total += int(fields[1])
+    return set(proc.stdout.split()), total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check import cost of headless entry points")
+    parser.add_argument("--max-ms", type=float, help="fail if an entry point takes longer to import")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for statement, forbidden in CHECKS:
+        modules, total = profile(statement)
+        loaded = sorted(name for name in forbidden if name in modules)
+        status = "ok"
+        if loaded:
+            status = "loads " + ", ".join(loaded)
+            failures += 1
+        elif args.max_ms is not None and total / 1000 > args.max_ms:
+            status = f"slower than {args.max_ms} ms"
+            failures += 1
+        print(f"{statement:<30} {total / 1000:8.1f} ms  {status}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
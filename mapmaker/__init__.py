@@ -1,6 +1,22 @@
 """MapMaker package"""
 
+__version__ = "0.1.0"
+
 from .generator import draw_map, generate_map_data
-from .gui import MapEditor
+from .stats import GenerationStats
+
+__all__ = ["draw_map", "generate_map_data", "GenerationCache", "GenerationStats", "MapEditor"]
+
+
+def __getattr__(name):
+    # The editor needs tkinter, which headless servers often lack, so it is
+    # only imported when somebody actually asks for it.
+    if name == "MapEditor":
+        from .gui import MapEditor
+
+        return MapEditor
+    if name == "GenerationCache":
+        from .cache import GenerationCache
 
-__all__ = ["draw_map", "generate_map_data", "MapEditor"]
+        return GenerationCache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,192 @@
+"""Generate many maps in one long-lived process pool."""
+
+import csv
+import json
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from . import generator as mg
+from .stats import GenerationStats
+
+# Manifest columns that hold integers when read from CSV.
+INT_FIELDS = (
+    "width",
+    "height",
+    "num_shapes",
+    "num_districts",
+    "num_walls",
+    "seed",
+    "jobs",
+    "tile_size",
+    "compress_level",
+)
+# Manifest columns that hold booleans when read from CSV.
+BOOL_FIELDS = ("palette",)
+
+
+def load_manifest(path):
+    """Read a list of parameter sets from a JSON or CSV file.
+
+    Keys are :func:`mapmaker.generator.draw_map` keyword arguments plus
+    ``preset`` and ``output``. In CSV files ``road_points`` is a space
+    separated list of ``x y`` pairs.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="") as fh:
+            rows = list(csv.DictReader(fh))
+        jobs = []
+        for row in rows:
+            job = {key: value for key, value in row.items() if value not in (None, "")}
+            for key in INT_FIELDS:
+                if key in job:
+                    job[key] = int(job[key])
+            for key in BOOL_FIELDS:
+                if key in job:
+                    job[key] = job[key].strip().lower() in ("1", "true", "yes")
+            if "road_points" in job:
+                coords = [int(v) for v in job["road_points"].split()]
+                job["road_points"] = list(zip(coords[::2], coords[1::2]))
+            jobs.append(job)
+        return jobs
+    with open(path) as fh:
+        jobs = json.load(fh)
+    if not isinstance(jobs, list):
+        raise ValueError(f"{path}: manifest must be a list of parameter sets")
+    return jobs
+
+
+def output_path(template, index, seed):
+    """Return the output path of map ``index``.
+
+    ``template`` may use ``{index}`` and ``{seed}`` fields; otherwise the
+    index is appended to the file name.
+    """
+    if "{" in template:
+        return template.format(index=index, seed=seed)
+    root, ext = os.path.splitext(template)
+    return f"{root}_{index:04d}{ext}"
+
+
+def plan_jobs(jobs, defaults, template, seed=None):
+    """Fill in parameters, a seed and an output path for every job.
+
+    A ``save_data`` path is expanded per job like the output template.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    planned = []
+    for index, job in enumerate(jobs):
+        params = dict(defaults)
+        params.update(job)
+        params.setdefault("seed", mg.derive_seed(seed, "batch", index))
+        output = params.get("output")
+        if output is None:
+            params["output"] = output_path(template, index, params["seed"])
+        elif "{" in output:
+            params["output"] = output_path(output, index, params["seed"])
+        if params.get("save_data"):
+            params["save_data"] = output_path(params["save_data"], index, params["seed"])
+        planned.append(params)
+    return planned
+
+
+def run_job(params):
+    """Render one map and return a summary record. Runs in a worker."""
+    params = dict(params)
+    output = params.pop("output")
+    preset = params.pop("preset", None)
+    if preset:
+        params["width"], params["height"] = mg.RESOLUTION_PRESETS[preset]
+    record = {"output": output, "seed": params.get("seed")}
+    stats = GenerationStats()
+    start = time.perf_counter()
+    try:
+        width = params.get("width", mg.DEFAULT_WIDTH)
+        height = params.get("height", mg.DEFAULT_HEIGHT)
+        if not mg.validate_resolution(width, height, tiled=bool(params.get("tile_size"))):
+            raise ValueError(f"Unsupported resolution {width}x{height}")
+        for path in (output, params.get("save_data")):
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mg.draw_map(filename=output, stats=stats, **params)
+        record["ok"] = True
+    except Exception as exc:
+        record["ok"] = False
+        record["error"] = f"{type(exc).__name__}: {exc}"
+        record["traceback"] = traceback.format_exc()
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    record["stats"] = stats.to_dict()
+    return record
+
+
+def run_batch(jobs, workers=None):
+    """Render every planned job and return their summary records in order.
+
+    Work is spread over ``workers`` processes (all cores by default) that
+    stay alive for the whole batch; ``workers=1`` runs everything inline.
+    """
+    if workers == 1:
+        return [run_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run_job, jobs))
+
+
+def summarize(records, elapsed):
+    """Return a JSON-friendly summary of a finished batch."""
+    failed = [r for r in records if not r["ok"]]
+    times = sorted(r["seconds"] for r in records if r["ok"])
+    return {
+        "maps": len(records),
+        "failed": len(failed),
+        "elapsed": round(elapsed, 4),
+        "min_seconds": times[0] if times else None,
+        "median_seconds": times[len(times) // 2] if times else None,
+        "max_seconds": times[-1] if times else None,
+        "records": records,
+    }
+
+
+def run_cli(args, road_points):
+    """Run the batch described by parsed ``generate.py`` arguments."""
+    if args.manifest:
+        jobs = load_manifest(args.manifest)
+    else:
+        jobs = [{} for _ in range(args.batch)]
+    defaults = {
+        "width": args.width,
+        "height": args.height,
+        "num_shapes": args.num_shapes,
+        "num_districts": args.districts,
+        "district_mode": args.district_mode,
+        "num_walls": args.walls,
+        "road_points": road_points,
+        "placement": args.placement,
+        "tile_size": args.tile_size,
+        "save_data": args.save_data,
+        "palette": args.palette,
+        "compress_level": args.compress_level,
+    }
+    if args.cache_dir:
+        from .cache import GenerationCache
+
+        defaults["cache"] = GenerationCache(args.cache_dir, args.cache_mb << 20)
+    planned = plan_jobs(jobs, defaults, args.output, args.seed)
+    start = time.perf_counter()
+    records = run_batch(planned, args.workers)
+    summary = summarize(records, time.perf_counter() - start)
+    median = summary["median_seconds"]
+    print(
+        f"Generated {summary['maps'] - summary['failed']} of {summary['maps']} maps "
+        f"in {summary['elapsed']:.2f}s"
+        + (f" (median {median}s per map)" if median is not None else "")
+    )
+    for record in records:
+        if not record["ok"]:
+            print(f"  failed {record['output']}: {record['error']}")
+    if args.summary:
+        with open(args.summary, "w") as fh:
+            json.dump(summary, fh, indent=2)
+    return summary
@@ -0,0 +1,124 @@
+"""On-disk cache of generated maps, keyed by their parameters.
+
+Every seeded set of generation parameters maps to one entry directory named
+after a hash of the parameters, the seed and the library version. The entry
+holds the map data as a project file (see :mod:`mapmaker.project`) plus one
+encoded image per set of render options, so a repeated request is a file
+copy. Entries are evicted least recently used first once the cache grows
+beyond its size cap; recency is the entry directory's modification time,
+which makes the cache safe to share between processes.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from . import __version__
+
+CACHE_BYTES = 1 << 30
+DATA_FILE = "map.mapdata"
+
+
+class GenerationCache:
+    """Cache generated maps under ``directory``, using at most ``max_bytes``."""
+
+    def __init__(self, directory, max_bytes=CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, **params):
+        """Return the cache key of a set of generation parameters."""
+        from .project import FORMAT_VERSION
+
+        blob = json.dumps(
+            {"version": __version__, "format": FORMAT_VERSION, "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def image_name(self, filename, palette=False, compress_level=None):
+        """Return the file name an image rendered with these options is cached as."""
+        ext = os.path.splitext(filename)[1].lower() or ".png"
+        options = json.dumps([ext, bool(palette), compress_level]).encode()
+        return "image-" + hashlib.sha256(options).hexdigest()[:16] + ext
+
+    def path(self, key, name=DATA_FILE):
+        return os.path.join(self.directory, key[:2], key, name)
+
+    def fetch(self, key, name, dest):
+        """Copy cached file ``name`` of ``key`` to ``dest``; return False on a miss."""
+        try:
+            shutil.copyfile(self.path(key, name), dest)
+            os.utime(os.path.dirname(self.path(key)))
+        except OSError:
+            return False
+        return True
+
+    def load_data(self, key):
+        """Return the cached map data of ``key``, or None."""
+        from .project import load_project
+
+        path = self.path(key)
+        try:
+            # Read into memory: the entry may be evicted while the data is in use.
+            data = load_project(path, mmap=False)
+            os.utime(os.path.dirname(path))
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def store_data(self, key, data):
+        """Add the map data of ``key`` to the cache."""
+        from .project import save_project
+
+        self._store(key, DATA_FILE, lambda path: save_project(data, path))
+
+    def store_file(self, key, name, source):
+        """Add a copy of the file ``source`` to the cache as ``name`` of ``key``."""
+        self._store(key, name, lambda path: shutil.copyfile(source, path))
+
+    def _store(self, key, name, write):
+        entry = os.path.dirname(self.path(key))
+        os.makedirs(entry, exist_ok=True)
+        # Write under a temporary name so readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=entry, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, self.path(key, name))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict(keep=entry)
+
+    def entries(self):
+        """Return ``(mtime, size, path)`` of every cache entry."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except OSError:
+                    continue  # Evicted by another process meanwhile.
+        return entries
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries until the cache fits its cap.
+
+        The entry ``keep`` goes last, so a fresh entry survives unless it is
+        larger than the whole cache.
+        """
+        entries = sorted(self.entries(), key=lambda e: (e[2] == keep, e[0]))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,93 @@
+"""Partition the canvas into districts with a relaxed Voronoi tessellation."""
+
+import numpy as np
+from scipy.spatial import Voronoi
+
+from .mapdata import Polygons
+from .vectorized import numpy_rng
+
+# Lloyd relaxation steps; a few are enough to even out the cell sizes.
+LLOYD_ITERATIONS = 3
+
+
+def bounded_voronoi(seeds, width, height):
+    """Return the Voronoi cells of ``seeds`` clipped to the canvas.
+
+    The seeds are mirrored across all four borders, which makes the borders
+    ridges of the diagram, so the cells of the original seeds are exactly
+    the canvas partition. Returns ``(coords, offsets)`` with the vertices of
+    every cell in order around it, plus the diagram itself.
+    """
+    x = seeds[:, 0]
+    y = seeds[:, 1]
+    mirrored = np.concatenate(
+        [
+            seeds,
+            np.stack([-x, y], axis=1),
+            np.stack([2 * width - x, y], axis=1),
+            np.stack([x, -y], axis=1),
+            np.stack([x, 2 * height - y], axis=1),
+        ]
+    )
+    vor = Voronoi(mirrored)
+    regions = [vor.regions[r] for r in vor.point_region[: len(seeds)]]
+    counts = np.array([len(region) for region in regions])
+    offsets = np.zeros(len(seeds) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    owner = np.repeat(np.arange(len(seeds)), counts)
+    coords = vor.vertices[np.concatenate(regions)]
+    # Order the vertices of every cell by angle around its vertex mean.
+    center = np.add.reduceat(coords, offsets[:-1]) / counts[:, None]
+    rel = coords - center[owner]
+    order = np.lexsort((np.arctan2(rel[:, 1], rel[:, 0]), owner))
+    return coords[order], offsets, vor
+
+
+def centroids(coords, offsets):
+    """Return the area centroids of the polygons in ``coords``/``offsets``."""
+    # Index of the next vertex within the same polygon.
+    following = np.arange(len(coords)) + 1
+    following[offsets[1:] - 1] = offsets[:-1]
+    x, y = coords[:, 0], coords[:, 1]
+    nx, ny = x[following], y[following]
+    cross = x * ny - nx * y
+    area = np.add.reduceat(cross, offsets[:-1]) / 2
+    cx = np.add.reduceat((x + nx) * cross, offsets[:-1]) / (6 * area)
+    cy = np.add.reduceat((y + ny) * cross, offsets[:-1]) / (6 * area)
+    return np.stack([cx, cy], axis=1)
+
+
+def _neighbour_colors(vor, count, palette, rng):
+    """Color cells so neighbours differ where the palette allows it."""
+    pairs = vor.ridge_points
+    pairs = pairs[(pairs < count).all(axis=1)]
+    neighbours = [[] for _ in range(count)]
+    for a, b in pairs.tolist():
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    colors = np.full(count, -1, dtype=np.int64)
+    for i in rng.permutation(count).tolist():
+        taken = set(colors[neighbours[i]].tolist())
+        free = [c for c in range(palette) if c not in taken]
+        colors[i] = rng.choice(free) if free else rng.integers(palette)
+    return colors.astype(np.uint8)
+
+
+def voronoi_districts(width, height, count, rng=None, iterations=LLOYD_ITERATIONS, palette=6):
+    """Partition the canvas into exactly ``count`` districts.
+
+    Random seeds are moved to the centroids of their cells ``iterations``
+    times (Lloyd relaxation). Returns ``(polygons, colors)``: a
+    :class:`~mapmaker.mapdata.Polygons` with the integer cell outlines and a
+    palette slot per district, chosen so neighbouring districts differ.
+    """
+    if count <= 0:
+        return Polygons(), np.zeros(0, dtype=np.uint8)
+    rng = numpy_rng(rng)
+    seeds = rng.uniform((0, 0), (width, height), size=(count, 2))
+    coords, offsets, vor = bounded_voronoi(seeds, width, height)
+    for _ in range(iterations):
+        seeds = centroids(coords, offsets)
+        coords, offsets, vor = bounded_voronoi(seeds, width, height)
+    colors = _neighbour_colors(vor, count, palette, rng)
+    return Polygons(np.rint(coords), offsets), colors
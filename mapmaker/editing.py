@@ -0,0 +1,222 @@
+"""Selection, moving and deleting features of map data with undo.
+
+:class:`MapEdits` keeps a spatial index of every feature next to the
+:class:`~mapmaker.mapdata.MapData`, so hit tests only look at the features
+near the point. Features are addressed as ``(layer, index)`` keys that stay
+valid across edits: moves shift the arrays in place and deletes only mark
+features as removed. Undo and redo replay a log of these small deltas
+instead of snapshots of the map.
+"""
+
+import numpy as np
+
+from . import render
+from .mapdata import L_SHAPE, LAYERS, POLYGON
+
+# Edits kept for undo; older ones are forgotten.
+HISTORY_LIMIT = 1000
+
+# Half the stroke width of the line layers, for hit tests.
+LINE_REACH = {
+    "roads": render.ROAD_WIDTH / 2,
+    "rivers": render.RIVER_WIDTH / 2,
+    "walls": render.WALL_WIDTH / 2,
+}
+
+
+def feature_bounds(data, layer, index):
+    """Return the pixel box feature ``index`` of ``layer`` draws into."""
+    return tuple(render.layer_bounds(data.take({layer: [index]}), layer)[0].tolist())
+
+
+def point_in_polygon(x, y, points):
+    """Even-odd test of ``(x, y)`` against a ``[(x, y), ...]`` polygon."""
+    inside = False
+    px, py = points[-1]
+    for qx, qy in points:
+        if (qy > y) != (py > y) and x < (px - qx) * (y - qy) / (py - qy) + qx:
+            inside = not inside
+        px, py = qx, qy
+    return inside
+
+
+def segment_distance(x, y, x1, y1, x2, y2):
+    """Return the distance from ``(x, y)`` to the segment ``(x1, y1)-(x2, y2)``."""
+    dx = x2 - x1
+    dy = y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if not length else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
+
+
+def feature_contains(data, layer, index, x, y, tolerance=0):
+    """Return True if the drawn feature covers ``(x, y)``, give or take ``tolerance``."""
+    if layer in ("roads", "rivers"):
+        reach = LINE_REACH[layer] + tolerance
+        return segment_distance(x, y, *getattr(data, layer)[index].tolist()) <= reach
+    if layer == "walls":
+        points = data.walls.points(index)
+        reach = LINE_REACH[layer] + tolerance
+        return any(
+            segment_distance(x, y, *a, *b) <= reach for a, b in zip(points, points[1:] + points[:1])
+        )
+    if layer == "districts":
+        return point_in_polygon(x, y, data.districts.points(index))
+    code = data.building_types[index]
+    if code == POLYGON:
+        return point_in_polygon(x, y, data.building_polygons.points(index))
+    box = data.building_boxes[index].tolist()
+    rects = render.l_shape_rects(box) if code == L_SHAPE else (box,)
+    return any(
+        x1 - tolerance <= x <= x2 + tolerance and y1 - tolerance <= y <= y2 + tolerance
+        for x1, y1, x2, y2 in rects
+    )
+
+
+def shift_feature(data, layer, index, dx, dy):
+    """Move a feature by ``dx, dy`` in place."""
+    if layer == "buildings":
+        data.building_boxes[index] += (dx, dy, dx, dy)
+        data.building_polygons[index][:] += (dx, dy)
+    elif layer in ("roads", "rivers"):
+        getattr(data, layer)[index] += (dx, dy, dx, dy)
+    else:
+        getattr(data, layer)[index][:] += (dx, dy)
+    data.touch(layer)
+
+
+class MapEdits:
+    """Editable view of a :class:`~mapmaker.mapdata.MapData`.
+
+    ``items`` lists the ``(layer, index)`` key of every spatial index entry,
+    in the order of :func:`mapmaker.render.build_index`. Features added to
+    the data afterwards must be registered with :meth:`add`.
+    """
+
+    def __init__(self, data, cell_size=256):
+        self.data = data
+        self.items, self.index = render.build_index(data, cell_size)
+        self.ids = {key: i for i, key in enumerate(self.items)}
+        self.removed = set()
+        self.undo_log = []
+        self.redo_log = []
+        # Bumped on every change so derived data can tell it is stale.
+        self.revision = 0
+        self._removals = None
+
+    def hit_test(self, x, y, tolerance=0):
+        """Return the topmost feature at ``(x, y)`` as ``(layer, index)``, or None."""
+        found = self.index.query((x - tolerance, y - tolerance, x + tolerance + 1, y + tolerance + 1))
+        keys = [self.items[i] for i in found]
+        # Later layers, and later features in a layer, are drawn on top.
+        keys.sort(key=lambda key: (LAYERS.index(key[0]), key[1]), reverse=True)
+        for layer, index in keys:
+            if feature_contains(self.data, layer, index, x, y, tolerance):
+                return layer, index
+        return None
+
+    def query(self, box):
+        """Return the keys of the features whose bounds overlap ``box``."""
+        return [self.items[i] for i in self.index.query(box)]
+
+    def add(self, layer, index):
+        """Register feature ``index`` just appended to ``layer``, as an undoable edit."""
+        key = (layer, index)
+        self.ids[key] = self.index.insert(feature_bounds(self.data, layer, index))
+        self.items.append(key)
+        self._record(("add", (key,)))
+
+    def move(self, keys, dx, dy):
+        """Move the features ``keys`` by ``dx, dy``."""
+        keys = tuple(keys)
+        if keys and (dx or dy):
+            self._shift(keys, dx, dy)
+            self._record(("move", keys, dx, dy))
+
+    def delete(self, keys):
+        """Remove the features ``keys``."""
+        keys = tuple(key for key in keys if key not in self.removed)
+        if keys:
+            self._remove(keys)
+            self._record(("delete", keys))
+
+    def undo(self):
+        """Revert the last edit and return the keys it touched."""
+        if not self.undo_log:
+            return ()
+        command = self.undo_log.pop()
+        self._apply(command, reverse=True)
+        self.redo_log.append(command)
+        return command[1]
+
+    def redo(self):
+        """Apply the last undone edit again and return the keys it touched."""
+        if not self.redo_log:
+            return ()
+        command = self.redo_log.pop()
+        self._apply(command)
+        self.undo_log.append(command)
+        return command[1]
+
+    def removals(self):
+        """Return the removed feature indices as ``{layer: array}``.
+
+        Pass this as ``removed`` to :class:`mapmaker.render.LayerCache` to
+        draw :attr:`data` without the removed features; every removal bumps
+        the version of its layer only.
+        """
+        if self._removals is None or self._removals[0] != self.revision:
+            removals = {layer: [] for layer in LAYERS}
+            for layer, index in self.removed:
+                removals[layer].append(index)
+            for layer, gone in removals.items():
+                removals[layer] = np.array(sorted(gone), dtype=np.int64)
+            self._removals = self.revision, removals
+        return self._removals[1]
+
+    def compact(self):
+        """Return a copy of the map without removed features.
+
+        This is :attr:`data` itself while nothing is removed.
+        """
+        if not self.removed:
+            return self.data
+        removals = self.removals()
+        return self.data.take(
+            {layer: np.setdiff1d(np.arange(self.data.count(layer)), removals[layer]) for layer in LAYERS}
+        )
+
+    def _record(self, command):
+        self.undo_log.append(command)
+        del self.undo_log[:-HISTORY_LIMIT]
+        self.redo_log.clear()
+
+    def _apply(self, command, reverse=False):
+        kind, keys = command[:2]
+        if kind == "move":
+            dx, dy = command[2:]
+            self._shift(keys, -dx if reverse else dx, -dy if reverse else dy)
+        elif (kind == "delete") == reverse:
+            self._restore(keys)
+        else:
+            self._remove(keys)
+
+    def _shift(self, keys, dx, dy):
+        for layer, index in keys:
+            shift_feature(self.data, layer, index, dx, dy)
+            self.index.move(self.ids[(layer, index)], feature_bounds(self.data, layer, index))
+        self.revision += 1
+
+    def _remove(self, keys):
+        for key in keys:
+            self.index.remove(self.ids[key])
+            self.removed.add(key)
+            self.data.touch(key[0])
+        self.revision += 1
+
+    def _restore(self, keys):
+        for key in keys:
+            self.index.move(self.ids[key], feature_bounds(self.data, *key))
+            self.removed.discard(key)
+            self.data.touch(key[0])
+        self.revision += 1
@@ -1,14 +1,38 @@
 import argparse
+import hashlib
+import json
 import random
 import math
-from PIL import Image, ImageDraw
 
-from .roads import generate_road_network
+from .spatial import FreeSpaceMap, SpatialGrid
 
 # Default canvas size. These values can be overridden via command line
 # arguments or when calling the drawing functions directly.
 DEFAULT_WIDTH, DEFAULT_HEIGHT = 800, 600
 MAX_WIDTH, MAX_HEIGHT = 8192, 8192
+# Tiled rendering keeps only one tile in memory, so it allows far larger maps.
+TILED_MAX_WIDTH, TILED_MAX_HEIGHT = 262144, 262144
+
+# Cell size of the spatial index used for building overlap checks. It is
+# slightly larger than the biggest building so most boxes span few cells.
+BUILDING_CELL_SIZE = 128
+# Smallest and largest side any generated building can have.
+MIN_BUILDING_SIZE = 20
+MAX_BUILDING_SIZE = 120
+
+# "random" samples positions uniformly over the canvas, "free" samples only
+# from space that can still fit a building and stops once the canvas is full,
+# "batch" draws and tests candidates as NumPy arrays in blocks.
+PLACEMENT_MODES = ("random", "free", "batch")
+
+# "blobs" scatters non-overlapping irregular polygons and may place fewer
+# than requested, "voronoi" partitions the whole canvas into exactly that
+# many relaxed Voronoi cells.
+DISTRICT_MODES = ("blobs", "voronoi")
+
+# Side of the square regions buildings are generated in when running with
+# several jobs. Each region is an independent task with its own derived seed.
+TILE_SIZE = 1024
 
 RESOLUTION_PRESETS = {
     "1080p": (1920, 1080),
@@ -30,42 +54,280 @@ DISTRICT_COLORS = [
 ]
 
 
+class GenerationCancelled(Exception):
+    """Raised from a progress callback to abort map generation."""
+
+
 def intersects(a, b):
     ax1, ay1, ax2, ay2 = a
     bx1, by1, bx2, by2 = b
     return not (ax2 <= bx1 or ax1 >= bx2 or ay2 <= by1 or ay1 >= by2)
 
 
-def validate_resolution(width, height):
+def validate_resolution(width, height, tiled=False):
     """Return True if width and height are within supported range."""
+    if tiled:
+        return 1 <= width <= TILED_MAX_WIDTH and 1 <= height <= TILED_MAX_HEIGHT
     return 1 <= width <= MAX_WIDTH and 1 <= height <= MAX_HEIGHT
 
 
-def generate_buildings(width, height, num_shapes=10, max_attempts=1000):
-    """Generate building shapes within the given canvas size."""
+def make_rng(seed=None):
+    """Return a random number generator for ``seed``.
+
+    ``None`` uses the global ``random`` module state, an existing
+    ``random.Random`` instance is passed through and anything else seeds a
+    new local instance.
+    """
+    if seed is None or seed is random or isinstance(seed, random.Random):
+        return seed or random
+    return random.Random(seed)
+
+
+def derive_seed(seed, *keys):
+    """Derive a deterministic 64-bit seed from ``seed`` and ``keys``."""
+    digest = hashlib.sha256(repr((seed,) + keys).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def generate_buildings(
+    width, height, num_shapes=10, max_attempts=1000, placement="random", seed=None, progress=None, stats=None
+):
+    """Generate building shapes within the given canvas size.
+
+    With ``placement="free"`` candidates are drawn only from regions that
+    can still fit a building and generation stops early once the canvas is
+    saturated. In either mode fewer than ``num_shapes`` buildings may be
+    returned, so callers should check the length of the result.
+
+    ``placement="batch"`` uses the vectorized path in
+    :mod:`mapmaker.vectorized`, which is much faster for large counts but
+    draws a different random sequence than the other modes.
+
+    ``progress`` is called from time to time with the fraction of buildings
+    placed so far; it may raise :class:`GenerationCancelled` to stop.
+
+    ``stats`` is an optional :class:`~mapmaker.stats.GenerationStats` that
+    receives the requested and placed counts and the candidate attempts and
+    rejections under the ``"buildings"`` stage.
+    """
+    if placement not in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode: {placement!r}")
+    rng = make_rng(seed)
+    if placement == "batch":
+        return _batch_buildings(width, height, num_shapes, max_attempts, rng, progress, stats)
+    index = SpatialGrid(BUILDING_CELL_SIZE)
+    shapes, attempts, rejected = _place_buildings(
+        width, height, num_shapes, max_attempts, placement == "free", rng, index, progress
+    )
+    if stats is not None:
+        stats.count("buildings", requested=num_shapes, placed=len(shapes), attempts=attempts, rejected=rejected)
+    return shapes
+
+
+def _place_buildings(width, height, num_shapes, max_attempts, free_space, rng, index, progress=None):
+    """Place buildings one at a time around the boxes already in ``index``.
+
+    Returns the new shapes and the number of candidate attempts and
+    rejections.
+    """
     shapes = []
-    boxes = []
-    for _ in range(num_shapes):
+    free = None
+    if free_space:
+        free = FreeSpaceMap(width, height, MIN_BUILDING_SIZE)
+        for box in index.boxes:
+            free.occupy(box)
+    attempts = rejected = 0
+    for i in range(num_shapes):
+        if progress is not None and i % 64 == 0:
+            progress(i / num_shapes)
+        if free is not None and free.saturated:
+            break
         for _ in range(max_attempts):
-            shape_type = random.choice(["square", "rectangle", "l", "polygon"])
+            attempts += 1
+            shape_type = rng.choice(["square", "rectangle", "l", "polygon"])
             if shape_type == "square":
-                side = random.randint(20, 100)
+                side = rng.randint(MIN_BUILDING_SIZE, 100)
                 w = h = side
             else:
-                w = random.randint(30, 120)
-                h = random.randint(30, 120)
-            x = random.randint(0, width - w)
-            y = random.randint(0, height - h)
+                w = rng.randint(30, MAX_BUILDING_SIZE)
+                h = rng.randint(30, MAX_BUILDING_SIZE)
+            if free is None:
+                x = rng.randint(0, width - w)
+                y = rng.randint(0, height - h)
+            else:
+                if free.saturated:
+                    break
+                cell, x, y = free.sample(rng, w, h)
+                if x is None:
+                    # Too big for the canvas from this cell, but every live
+                    # cell still fits the smallest building: keep the cell.
+                    rejected += 1
+                    continue
             box = (x, y, x + w, y + h)
-            if any(intersects(box, b) for b in boxes):
+            if index.intersects_any(box):
+                rejected += 1
+                # Only count the anchor against its cell when not even the
+                # smallest building fits there; a smaller size may still do.
+                if free is not None and index.intersects_any(
+                    (x, y, x + MIN_BUILDING_SIZE, y + MIN_BUILDING_SIZE)
+                ):
+                    free.reject(cell)
                 continue
-            boxes.append(box)
+            index.insert(box)
+            if free is not None:
+                free.occupy(box)
             if shape_type == "polygon":
-                poly = random_polygon_from_box(box)
+                poly = random_polygon_from_box(box, seed=rng)
                 shapes.append((shape_type, poly))
             else:
                 shapes.append((shape_type, box))
             break
+    return shapes, attempts, rejected
+
+
+def _batch_buildings(width, height, num_shapes, max_attempts, rng, progress=None, stats=None):
+    from .mapdata import MapData
+
+    types, boxes, polygons = _batch_building_arrays(width, height, num_shapes, max_attempts, rng, progress, stats)
+    return MapData(width, height, types, boxes, polygons)["buildings"]
+
+
+def _batch_building_arrays(width, height, num_shapes, max_attempts, rng, progress=None, stats=None):
+    from . import vectorized
+    from .mapdata import spread_polygons
+
+    types, boxes, coords, offsets = vectorized.generate_buildings(
+        width,
+        height,
+        num_shapes,
+        max_attempts,
+        rng=rng.getrandbits(64),
+        min_size=MIN_BUILDING_SIZE,
+        progress=progress,
+        stats=stats,
+    )
+    return types, boxes, spread_polygons(types, coords, offsets)
+
+
+def _tile_edges(length, tile_size, min_size):
+    edges = list(range(0, length, tile_size)) + [length]
+    if len(edges) > 2 and edges[-1] - edges[-2] < min_size:
+        del edges[-2]
+    return edges
+
+
+def split_tiles(width, height, tile_size=TILE_SIZE, min_size=1):
+    """Return the ``(x1, y1, x2, y2)`` regions covering the canvas, row by row.
+
+    A last column or row narrower than ``min_size`` is merged into the tiles
+    before it.
+    """
+    xs = _tile_edges(width, tile_size, min_size)
+    ys = _tile_edges(height, tile_size, min_size)
+    return [(x1, y1, x2, y2) for y1, y2 in zip(ys, ys[1:]) for x1, x2 in zip(xs, xs[1:])]
+
+
+def _tile_quotas(tiles, total):
+    """Split ``total`` buildings between tiles in proportion to their area."""
+    areas = [(x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in tiles]
+    canvas = sum(areas)
+    quotas = [total * area // canvas for area in areas]
+    order = sorted(range(len(tiles)), key=lambda i: (-(total * areas[i] % canvas), i))
+    for i in order[: total - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+def _offset_shape(shape, dx, dy):
+    shape_type, data = shape
+    if shape_type == "polygon":
+        return shape_type, [(x + dx, y + dy) for x, y in data]
+    x1, y1, x2, y2 = data
+    return shape_type, (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+
+
+def _generate_tile(task):
+    """Generate the buildings of one tile. Runs in a worker process.
+
+    Returns the shapes and the tile's ``"buildings"`` stats counters.
+    """
+    from .stats import GenerationStats
+
+    x, y, width, height, count, max_attempts, placement, seed = task
+    stats = GenerationStats()
+    shapes = generate_buildings(width, height, count, max_attempts, placement, seed=seed, stats=stats)
+    counters = stats.record("buildings")
+    del counters["seconds"]
+    return [_offset_shape(shape, x, y) for shape in shapes], counters
+
+
+def generate_buildings_tiled(
+    width,
+    height,
+    num_shapes=10,
+    max_attempts=1000,
+    placement="random",
+    seed=None,
+    jobs=None,
+    tile_size=TILE_SIZE,
+    stats=None,
+):
+    """Generate buildings tile by tile across a pool of worker processes.
+
+    Every tile gets a share of ``num_shapes`` proportional to its area and a
+    seed derived from ``seed`` and its position, so the result only depends
+    on the seed and ``tile_size``, not on the number of jobs. Buildings may
+    reach up to :data:`MAX_BUILDING_SIZE` pixels into the next tile; the
+    merge step keeps tiles in order and drops buildings overlapping one
+    already kept. Replacements for the dropped buildings are then placed
+    one by one around the merged ones, with a seed derived from ``seed``, so
+    the map gets as many buildings as without tiles unless it is full.
+
+    With ``stats`` the counters of all tiles and of the replacement pass
+    are summed up, ``placed`` counts the final result and ``dropped`` the
+    buildings the merge removed.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if seed is None:
+        seed = random.getrandbits(64)
+    # Every tile must be able to hold the largest building.
+    tiles = split_tiles(width, height, tile_size, MAX_BUILDING_SIZE)
+    tasks = []
+    for i, ((x1, y1, x2, y2), quota) in enumerate(zip(tiles, _tile_quotas(tiles, num_shapes))):
+        if not quota:
+            continue
+        w = min(x2 + MAX_BUILDING_SIZE, width) - x1
+        h = min(y2 + MAX_BUILDING_SIZE, height) - y1
+        tasks.append((x1, y1, w, h, quota, max_attempts, placement, derive_seed(seed, "tile", i)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(_generate_tile, tasks))
+
+    index = SpatialGrid(BUILDING_CELL_SIZE)
+    shapes = []
+    dropped = 0
+    for tile_shapes, counters in results:
+        if stats is not None:
+            stats.count("buildings", attempts=counters["attempts"], rejected=counters["rejected"])
+        for shape in tile_shapes:
+            shape_type, data = shape
+            box = polygon_bounds(data) if shape_type == "polygon" else data
+            if index.intersects_any(box):
+                dropped += 1
+                continue
+            index.insert(box)
+            shapes.append(shape)
+    if dropped:
+        # Batch placement has no serial counterpart; its few replacements
+        # use the per-building loop.
+        refill, attempts, rejected = _place_buildings(
+            width, height, dropped, max_attempts, placement == "free", make_rng(derive_seed(seed, "refill")), index
+        )
+        shapes.extend(refill)
+        if stats is not None:
+            stats.count("buildings", attempts=attempts, rejected=rejected)
+    if stats is not None:
+        stats.count("buildings", requested=num_shapes, placed=len(shapes), dropped=dropped)
     return shapes
 
 
@@ -82,13 +344,14 @@ def draw_polygon(draw, points):
     draw.polygon(points, fill=SHAPE_COLOR)
 
 
-def random_polygon_from_box(box, min_vertices=3, max_vertices=6):
+def random_polygon_from_box(box, min_vertices=3, max_vertices=6, seed=None):
     """Create a random polygon that fits inside the given box."""
+    rng = make_rng(seed)
     x1, y1, x2, y2 = box
     points = []
-    for _ in range(random.randint(min_vertices, max_vertices)):
-        px = random.randint(x1, x2)
-        py = random.randint(y1, y2)
+    for _ in range(rng.randint(min_vertices, max_vertices)):
+        px = rng.randint(x1, x2)
+        py = rng.randint(y1, y2)
         points.append((px, py))
     return points
 
@@ -100,8 +363,11 @@ def polygon_bounds(points):
     return min(xs), min(ys), max(xs), max(ys)
 
 
-def generate_irregular_polygon(cx, cy, avg_radius, irregularity=0.3, spikeyness=0.2, num_vertices=8):
+def generate_irregular_polygon(
+    cx, cy, avg_radius, irregularity=0.3, spikeyness=0.2, num_vertices=8, seed=None
+):
     """Generate an irregular polygon around a center point."""
+    rng = make_rng(seed)
     irregularity = max(0, min(irregularity, 1)) * 2 * math.pi / num_vertices
     spikeyness = max(0, min(spikeyness, 1)) * avg_radius
 
@@ -110,16 +376,16 @@ def generate_irregular_polygon(cx, cy, avg_radius, irregularity=0.3, spikeyness=
     upper = (2 * math.pi / num_vertices) + irregularity
     sum_steps = 0
     for _ in range(num_vertices):
-        step = random.uniform(lower, upper)
+        step = rng.uniform(lower, upper)
         angle_steps.append(step)
         sum_steps += step
     k = sum_steps / (2 * math.pi)
     angle_steps = [step / k for step in angle_steps]
 
     points = []
-    angle = random.uniform(0, 2 * math.pi)
+    angle = rng.uniform(0, 2 * math.pi)
     for step in angle_steps:
-        r = max(5, random.gauss(avg_radius, spikeyness))
+        r = max(5, rng.gauss(avg_radius, spikeyness))
         x = cx + r * math.cos(angle)
         y = cy + r * math.sin(angle)
         points.append((int(x), int(y)))
@@ -127,27 +393,81 @@ def generate_irregular_polygon(cx, cy, avg_radius, irregularity=0.3, spikeyness=
     return points
 
 
-def generate_districts(width, height, count, max_attempts=1000):
-    """Generate irregular district polygons that do not overlap."""
+def generate_districts(
+    width, height, count, max_attempts=1000, placement="random", seed=None, mode="blobs", stats=None
+):
+    """Generate irregular district polygons that do not overlap.
+
+    ``placement="batch"`` draws the candidates with NumPy in blocks; the
+    other placement modes only affect buildings. ``mode="voronoi"`` instead
+    partitions the canvas into exactly ``count`` districts (see
+    :func:`mapmaker.districts.voronoi_districts`). ``stats`` receives the
+    counters of the ``"districts"`` stage like in :func:`generate_buildings`.
+    """
+    if mode not in DISTRICT_MODES:
+        raise ValueError(f"Unknown district mode: {mode!r}")
+    rng = make_rng(seed)
+    if mode == "voronoi":
+        from .mapdata import MapData
+
+        polygons, colors = _voronoi_district_arrays(width, height, count, rng, stats)
+        return MapData(width, height, districts=polygons, district_colors=colors)["districts"]
+    if placement == "batch":
+        from .mapdata import MapData
+
+        polygons, colors = _batch_district_arrays(width, height, count, max_attempts, rng, stats)
+        return MapData(width, height, districts=polygons, district_colors=colors)["districts"]
     districts = []
-    boxes = []
+    index = SpatialGrid(max(1, min(width, height) // 4))
     attempts = 0
     while len(districts) < count and attempts < max_attempts:
-        radius = random.randint(min(width, height) // 8, min(width, height) // 3)
-        cx = random.randint(radius, width - radius)
-        cy = random.randint(radius, height - radius)
-        poly = generate_irregular_polygon(cx, cy, radius)
+        radius = rng.randint(min(width, height) // 8, min(width, height) // 3)
+        cx = rng.randint(radius, width - radius)
+        cy = rng.randint(radius, height - radius)
+        poly = generate_irregular_polygon(cx, cy, radius, seed=rng)
         box = polygon_bounds(poly)
-        if any(intersects(box, b) for b in boxes):
+        if index.intersects_any(box):
             attempts += 1
             continue
-        boxes.append(box)
-        districts.append({"poly": poly, "color": random.choice(DISTRICT_COLORS)})
+        index.insert(box)
+        districts.append({"poly": poly, "color": rng.choice(DISTRICT_COLORS)})
+    if stats is not None:
+        stats.count(
+            "districts",
+            requested=count,
+            placed=len(districts),
+            attempts=len(districts) + attempts,
+            rejected=attempts,
+        )
     return districts
 
 
-def generate_walls(width, height, count=1):
+def _batch_district_arrays(width, height, count, max_attempts, rng, stats=None):
+    from . import vectorized
+    from .mapdata import Polygons
+
+    polys, colors = vectorized.generate_districts(
+        width, height, count, max_attempts, rng=rng.getrandbits(64), stats=stats
+    )
+    offsets = [i * polys.shape[1] for i in range(len(polys) + 1)]
+    return Polygons(polys.reshape(-1, 2), offsets), colors
+
+
+def _voronoi_district_arrays(width, height, count, rng, stats=None):
+    from .districts import LLOYD_ITERATIONS, voronoi_districts
+
+    polygons, colors = voronoi_districts(
+        width, height, count, rng=rng.getrandbits(64), palette=len(DISTRICT_COLORS)
+    )
+    if stats is not None:
+        # Every cell is kept, so there are no rejected candidates.
+        stats.count("districts", requested=count, placed=len(polygons), iterations=LLOYD_ITERATIONS)
+    return polygons, colors
+
+
+def generate_walls(width, height, count=1, seed=None):
     """Generate one or more irregular wall polygons around the map."""
+    rng = make_rng(seed)
     walls = []
     margin = min(width, height) // 15
     cx, cy = width // 2, height // 2
@@ -160,15 +480,31 @@ def generate_walls(width, height, count=1):
             irregularity=0.1 + 0.05 * i,
             spikeyness=0.05,
             num_vertices=12,
+            seed=rng,
         )
         walls.append(wall)
     return walls
 
 
-def generate_roads(points, width, height):
-    """Return a list of road line segments from control points."""
-    if not points:
-        return []
+def generate_roads(points, width, height, network=None):
+    """Return the road line segments of control points.
+
+    The result is always an ``(n, 4)`` int32 NumPy array of ``x1, y1, x2,
+    y2`` segments, also when there are no points; it used to be a list of
+    tuples, so test it with ``len(roads)`` rather than ``if roads:``. With a
+    :class:`~mapmaker.roads.RoadNetwork` the points are added to its
+    existing diagram instead of building a new one.
+    """
+    if network is not None:
+        network.update(points)
+        return network.segments(width, height)
+    if not len(points):
+        import numpy as np
+
+        return np.zeros((0, 4), dtype=np.int32)
+    # Imported here so maps without roads never load SciPy.
+    from .roads import generate_road_network
+
     return generate_road_network(points, width, height)
 
 
@@ -179,14 +515,132 @@ def generate_map_data(
     num_districts=0,
     num_walls=1,
     road_points=None,
+    placement="random",
+    seed=None,
+    jobs=1,
+    progress=None,
+    road_network=None,
+    district_mode="blobs",
+    stats=None,
 ):
-    return {
-        "buildings": generate_buildings(width, height, num_shapes),
-        "roads": generate_roads(road_points or [], width, height),
-        "rivers": [],
-        "districts": generate_districts(width, height, num_districts) if num_districts > 0 else [],
-        "walls": generate_walls(width, height, num_walls) if num_walls > 0 else [],
-    }
+    """Generate all map layers and return them as a :class:`~mapmaker.mapdata.MapData`.
+
+    With a ``seed`` every layer uses its own derived local generator, so the
+    result is reproducible and independent of global ``random`` state. With
+    ``jobs`` above one, buildings are generated tile by tile in a process
+    pool (see :func:`generate_buildings_tiled`).
+
+    ``progress`` is called as ``progress(stage, fraction)`` when a stage
+    starts and while buildings are placed. Raising
+    :class:`GenerationCancelled` from it aborts generation.
+
+    ``district_mode`` selects the district engine, see
+    :data:`DISTRICT_MODES`. ``road_network`` is an optional
+    :class:`~mapmaker.roads.RoadNetwork` reused between calls, so that only
+    new road points are added to it.
+
+    ``stats`` is an optional :class:`~mapmaker.stats.GenerationStats`
+    that records the wall time of every stage and the placement counters
+    of buildings and districts.
+    """
+    from .mapdata import MapData, Polygons, building_arrays
+    from .stats import timed
+
+    if district_mode not in DISTRICT_MODES:
+        raise ValueError(f"Unknown district mode: {district_mode!r}")
+
+    if progress is None:
+        progress = _no_progress
+    if seed is None:
+        seeds = {"buildings": None, "districts": None, "walls": None}
+    else:
+        seeds = {stage: derive_seed(seed, stage) for stage in ("buildings", "districts", "walls")}
+    progress("buildings", 0.0)
+    with timed(stats, "buildings"):
+        if jobs > 1:
+            buildings = building_arrays(
+                generate_buildings_tiled(
+                    width,
+                    height,
+                    num_shapes,
+                    placement=placement,
+                    seed=seeds["buildings"],
+                    jobs=jobs,
+                    stats=stats,
+                )
+            )
+        elif placement == "batch":
+            # Keep the vectorized output as arrays instead of going through tuples.
+            buildings = _batch_building_arrays(
+                width,
+                height,
+                num_shapes,
+                1000,
+                make_rng(seeds["buildings"]),
+                progress=lambda fraction: progress("buildings", fraction),
+                stats=stats,
+            )
+        else:
+            buildings = building_arrays(
+                generate_buildings(
+                    width,
+                    height,
+                    num_shapes,
+                    placement=placement,
+                    seed=seeds["buildings"],
+                    progress=lambda fraction: progress("buildings", fraction),
+                    stats=stats,
+                )
+            )
+    progress("roads", 0.0)
+    with timed(stats, "roads"):
+        roads = generate_roads(road_points or [], width, height, road_network)
+    if stats is not None:
+        stats.count("roads", points=len(road_points or []), segments=len(roads))
+    progress("districts", 0.0)
+    with timed(stats, "districts"):
+        if num_districts <= 0:
+            districts, colors = Polygons(), []
+        elif district_mode == "voronoi":
+            districts, colors = _voronoi_district_arrays(
+                width, height, num_districts, make_rng(seeds["districts"]), stats
+            )
+        elif placement == "batch":
+            districts, colors = _batch_district_arrays(
+                width, height, num_districts, 1000, make_rng(seeds["districts"]), stats
+            )
+        else:
+            shapes = generate_districts(
+                width,
+                height,
+                num_districts,
+                placement=placement,
+                seed=seeds["districts"],
+                mode=district_mode,
+                stats=stats,
+            )
+            districts = Polygons.from_lists([d["poly"] for d in shapes])
+            colors = [DISTRICT_COLORS.index(d["color"]) for d in shapes]
+    progress("walls", 0.0)
+    with timed(stats, "walls"):
+        walls = generate_walls(width, height, num_walls, seed=seeds["walls"]) if num_walls > 0 else []
+    progress("done", 1.0)
+    types, boxes, polygons = buildings
+    return MapData(
+        width,
+        height,
+        building_types=types,
+        building_boxes=boxes,
+        building_polygons=polygons,
+        roads=roads,
+        districts=districts,
+        district_colors=colors,
+        walls=Polygons.from_lists(walls),
+    )
+
+
+def _no_progress(stage, fraction):
+    pass
 
 
 def draw_map(
@@ -196,27 +650,126 @@ def draw_map(
     num_shapes=10,
     num_districts=0,
     num_walls=1,
+    road_points=None,
+    placement="random",
+    seed=None,
+    jobs=1,
+    tile_size=None,
+    save_data=None,
+    district_mode="blobs",
+    stats=None,
+    palette=False,
+    compress_level=None,
+    cache=None,
 ):
-    img = Image.new("RGB", (width, height), BG_COLOR)
-    draw = ImageDraw.Draw(img)
-    data = generate_map_data(width, height, num_shapes, num_districts, num_walls)
-    for shape_type, shape_data in data["buildings"]:
-        if shape_type == "l":
-            draw_l_shape(draw, shape_data)
-        elif shape_type == "polygon":
-            draw_polygon(draw, shape_data)
-        else:
-            draw.rectangle(shape_data, fill=SHAPE_COLOR)
-    for district in data["districts"]:
-        color = district["color"]
-        poly = district["poly"]
-        draw.polygon(poly, outline="gray", fill=color, width=2)
-    for line in data["roads"]:
-        draw.line(line, fill="gray", width=2)
-    for wall in data["walls"]:
-        pts = wall + [wall[0]]
-        draw.line(pts, fill=SHAPE_COLOR, width=5)
-    img.save(filename)
+    """Generate a map and save it to ``filename``.
+
+    With ``tile_size`` the map is rendered tile by tile and ``filename`` is
+    a directory that receives the PNG tiles and a ``manifest.json``, which
+    keeps memory bounded by the tile size instead of the map size. With
+    ``save_data`` the generated map data is also written to that path as a
+    project file (see :mod:`mapmaker.project`).
+
+    ``palette`` renders into a palette image, a third of the memory of RGB
+    with identical pixel colors. The file format follows the extension of
+    ``filename`` (PNG, lossless WebP, TIFF, ...) and ``compress_level``
+    (0-9) trades encoding speed for file size, see
+    :func:`mapmaker.render.save_image`.
+
+    ``stats`` collects the generation stages of :func:`generate_map_data`
+    plus ``save_data``, ``render`` (rasterization) and ``encode`` (writing
+    the image file).
+
+    ``cache`` is a :class:`mapmaker.cache.GenerationCache`. Seeded maps are
+    then looked up there first: an image already rendered with the same
+    options is copied to ``filename``, otherwise cached map data skips
+    generation. Unseeded maps are never cached. Time spent on lookups and
+    copies is recorded as the ``cache`` stage.
+    """
+    from .stats import timed
+
+    key = image = data = None
+    if cache is not None and seed is not None:
+        from .cache import DATA_FILE
+
+        key = cache.key(
+            width=width,
+            height=height,
+            num_shapes=num_shapes,
+            num_districts=num_districts,
+            num_walls=num_walls,
+            road_points=road_points or [],
+            placement=placement,
+            seed=seed,
+            jobs=jobs,
+            district_mode=district_mode,
+        )
+        if not tile_size:
+            image = cache.image_name(filename, palette, compress_level)
+        with timed(stats, "cache"):
+            hit = image is not None and cache.fetch(key, image, filename)
+            if hit and (not save_data or cache.fetch(key, DATA_FILE, save_data)):
+                print(f"Map copied from cache to {filename}")
+                return
+            data = cache.load_data(key)
+    if data is None:
+        data = generate_map_data(
+            width,
+            height,
+            num_shapes,
+            num_districts,
+            num_walls,
+            road_points=road_points,
+            placement=placement,
+            seed=seed,
+            jobs=jobs,
+            district_mode=district_mode,
+            stats=stats,
+        )
+        placed = data.count("buildings")
+        if placed < num_shapes:
+            print(f"Canvas is full: placed {placed} of {num_shapes} buildings")
+        if key is not None:
+            with timed(stats, "cache"):
+                cache.store_data(key, data)
+    if save_data:
+        from .project import save_project
+
+        with timed(stats, "save_data"):
+            save_project(data, save_data)
+        print(f"Map data saved to {save_data}")
+    render_map(data, filename, tile_size, stats, palette, compress_level)
+    if image is not None:
+        with timed(stats, "cache"):
+            cache.store_file(key, image, filename)
+
+
+def render_map(data, filename="map.png", tile_size=None, stats=None, palette=False, compress_level=None):
+    """Render existing map data to ``filename`` like :func:`draw_map`.
+
+    Tiled output is rasterized and written tile by tile, so its ``render``
+    stage includes encoding the tiles.
+    """
+    from .render import render_image, render_tiles, save_image
+    from .stats import timed
+
+    if tile_size:
+        with timed(stats, "render"):
+            manifest = render_tiles(
+                data,
+                data.width,
+                data.height,
+                filename,
+                tile_size,
+                palette=palette,
+                compress_level=compress_level,
+            )
+        print(f"Map saved as {len(manifest['tiles'])} tiles in {filename}")
+        return
+    with timed(stats, "render"):
+        img = render_image(data, data.width, data.height, palette=palette)
+    with timed(stats, "encode"):
+        save_image(img, filename, compress_level)
     print(f"Map saved to {filename}")
 
 
@@ -227,6 +780,12 @@ def main(argv=None):
     parser.add_argument("--preset", choices=sorted(RESOLUTION_PRESETS.keys()), help="use a resolution preset")
     parser.add_argument("--num-shapes", type=int, default=10, help="number of buildings")
     parser.add_argument("--districts", type=int, default=0, help="number of districts to generate")
+    parser.add_argument(
+        "--district-mode",
+        choices=DISTRICT_MODES,
+        default="blobs",
+        help="district engine; 'voronoi' splits the whole map into exactly --districts cells",
+    )
     parser.add_argument("--walls", type=int, default=1, help="number of wall layers")
     parser.add_argument(
         "--road-points",
@@ -234,19 +793,152 @@ def main(argv=None):
         nargs="*",
         help="Pairs of x y coordinates for major roads",
     )
-    parser.add_argument("--output", type=str, default="map.png", help="output image path")
+    parser.add_argument(
+        "--placement",
+        choices=PLACEMENT_MODES,
+        default="random",
+        help="placement strategy; 'free' stops early once the map is full, 'batch' uses NumPy",
+    )
+    parser.add_argument("--seed", type=int, help="random seed for reproducible maps")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="worker processes; above 1 buildings are generated in parallel tiles",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        help="render tile by tile into the --output directory (PNG tiles plus manifest.json)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="map.png",
+        help="output image path; .webp is saved lossless and .tif/.tiff deflate-compressed",
+    )
+    parser.add_argument(
+        "--palette",
+        action="store_true",
+        help="render in palette mode, a third of the memory of RGB with identical pixels",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        help="0 (fastest) to 9 (smallest) compression of the output image",
+    )
+    parser.add_argument("--batch", type=int, help="generate this many maps, each with its own seed")
+    parser.add_argument("--manifest", help="JSON or CSV file with one parameter set per map")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="worker processes for batch mode, render threads for --serve (default: all cores)",
+    )
+    parser.add_argument("--summary", help="write per-map timing and failures of a batch as JSON")
+    parser.add_argument("--save-data", help="also save the generated map data as a project file")
+    parser.add_argument("--from-data", help="render a saved project file instead of generating a map")
+    parser.add_argument("--cache-dir", help="reuse seeded maps generated before from this directory")
+    parser.add_argument("--cache-mb", type=int, default=1024, help="size cap of --cache-dir")
+    parser.add_argument(
+        "--stats",
+        help="write per-stage timings and placement counters as JSON to this path",
+    )
+    parser.add_argument(
+        "--serve",
+        type=int,
+        metavar="PORT",
+        help="serve the map as /{z}/{x}/{y}.png tiles on this port instead of writing --output",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to serve tiles on")
+    parser.add_argument("--serve-cache-mb", type=int, default=64, help="memory for cached tiles when serving")
     args = parser.parse_args(argv)
 
+    if args.tile_size is not None and args.tile_size < 1:
+        parser.error("--tile-size must be at least 1")
+    if args.compress_level is not None and not 0 <= args.compress_level <= 9:
+        parser.error("--compress-level must be between 0 and 9")
+    if args.serve is not None and (args.batch or args.manifest or args.tile_size):
+        parser.error("--serve cannot be combined with --batch, --manifest or --tile-size")
+    if args.stats and (args.batch or args.manifest):
+        parser.error("--stats cannot be combined with --batch or --manifest; per-map stats are in --summary")
+    stats = None
+    if args.stats:
+        from .stats import GenerationStats
+
+        stats = GenerationStats()
+    if args.from_data:
+        from .project import load_project
+        from .stats import timed
+
+        if args.batch or args.manifest or args.save_data:
+            parser.error("--from-data cannot be combined with --batch, --manifest or --save-data")
+        try:
+            with timed(stats, "load"):
+                data = load_project(args.from_data)
+        except (OSError, ValueError) as exc:
+            parser.error(str(exc))
+        if args.serve is not None:
+            _write_stats(stats, args.stats)
+            _serve(data, args)
+            return
+        if not args.tile_size and not validate_resolution(data.width, data.height):
+            parser.error(f"Resolution must be within 1x1 and {MAX_WIDTH}x{MAX_HEIGHT}; use --tile-size")
+        render_map(data, args.output, args.tile_size, stats, args.palette, args.compress_level)
+        _write_stats(stats, args.stats)
+        return
+
     if args.preset:
         args.width, args.height = RESOLUTION_PRESETS[args.preset]
-    if not validate_resolution(args.width, args.height):
+    if args.tile_size or args.serve is not None:
+        if not validate_resolution(args.width, args.height, tiled=True):
+            parser.error(f"Tiled resolution must be within 1x1 and {TILED_MAX_WIDTH}x{TILED_MAX_HEIGHT}")
+    elif not validate_resolution(args.width, args.height):
         parser.error(f"Resolution must be within 1x1 and {MAX_WIDTH}x{MAX_HEIGHT}")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.cache_dir and args.seed is None and not (args.batch or args.manifest):
+        print("Note: --cache-dir only caches maps with a --seed")
+    if args.batch is not None and args.batch < 1:
+        parser.error("--batch must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     points = []
     if args.road_points and len(args.road_points) % 2 == 0:
         it = iter(args.road_points)
         points = [(next(it), next(it)) for _ in range(len(args.road_points) // 2)]
 
+    if args.batch or args.manifest:
+        from .batch import run_cli
+
+        summary = run_cli(args, points)
+        if summary["failed"]:
+            raise SystemExit(1)
+        return
+
+    if args.serve is not None:
+        data = generate_map_data(
+            args.width,
+            args.height,
+            args.num_shapes,
+            args.districts,
+            args.walls,
+            road_points=points,
+            placement=args.placement,
+            seed=args.seed,
+            jobs=args.jobs,
+            district_mode=args.district_mode,
+            stats=stats,
+        )
+        if args.save_data:
+            from .project import save_project
+
+            save_project(data, args.save_data)
+            print(f"Map data saved to {args.save_data}")
+        _write_stats(stats, args.stats)
+        _serve(data, args)
+        return
+
     draw_map(
         filename=args.output,
         width=args.width,
@@ -255,7 +947,48 @@ def main(argv=None):
         num_districts=args.districts,
         num_walls=args.walls,
         road_points=points,
+        placement=args.placement,
+        seed=args.seed,
+        jobs=args.jobs,
+        tile_size=args.tile_size,
+        save_data=args.save_data,
+        district_mode=args.district_mode,
+        stats=stats,
+        palette=args.palette,
+        compress_level=args.compress_level,
+        cache=_cache(args),
     )
+    _write_stats(stats, args.stats)
+
+
+def _cache(args):
+    if not args.cache_dir:
+        return None
+    from .cache import GenerationCache
+
+    return GenerationCache(args.cache_dir, args.cache_mb << 20)
+
+
+def _serve(data, args):
+    from .server import serve
+
+    serve(
+        data,
+        args.serve,
+        args.host,
+        cache_bytes=args.serve_cache_mb << 20,
+        workers=args.workers,
+        compress_level=args.compress_level,
+        palette=args.palette,
+    )
+
+
+def _write_stats(stats, path):
+    if stats is None:
+        return
+    with open(path, "w") as fh:
+        json.dump(stats.to_dict(), fh, indent=2)
+    print(f"Stats saved to {path}")
 
 
 if __name__ == "__main__":
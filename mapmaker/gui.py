@@ -1,10 +1,37 @@
 import tkinter as tk
 from tkinter import filedialog, ttk
-from PIL import Image, ImageDraw
 
 import argparse
+import queue
 import random
+import threading
+
+import numpy as np
+from PIL import Image, ImageTk
+
 from . import generator as mg
+from . import render
+from .editing import MapEdits, feature_bounds
+from .mapdata import LAYERS, MapData
+from .project import PROJECT_EXTENSION, load_project, save_project
+
+# How often the editor checks on a background generation, in milliseconds.
+POLL_INTERVAL = 50
+
+# Zoom steps of the view, in screen pixels per map pixel.
+ZOOM_LEVELS = (0.125, 0.25, 0.5, 1.0, 2.0, 4.0)
+# Below this zoom buildings are shown as one raster image instead of items.
+RASTER_ZOOM = 1.0
+# Canvas items are created for squares of this many map pixels at a time,
+# once any part of the square scrolls into view.
+VIEW_CHUNK = 512
+# Once this many squares hold items, items out of view are dropped.
+MAX_VIEW_CHUNKS = 24
+# Largest size of the canvas widget; larger maps are scrolled.
+VIEW_WIDTH, VIEW_HEIGHT = 1280, 800
+# Screen pixels a click may miss a feature by and still select it.
+HIT_TOLERANCE = 3
+SELECTION_COLOR = "red"
 
 
 class MapEditor(tk.Tk):
@@ -13,8 +40,18 @@ class MapEditor(tk.Tk):
         self.title("MapMaker GUI Editor")
         self.width = width
         self.height = height
-        self.canvas = tk.Canvas(self, width=self.width, height=self.height, bg=mg.BG_COLOR)
-        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.zoom = 1.0
+        self.view = ttk.Frame(self)
+        self.view.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(self.view, bg=mg.BG_COLOR, highlightthickness=0)
+        xbar = ttk.Scrollbar(self.view, orient=tk.HORIZONTAL, command=self._xview)
+        ybar = ttk.Scrollbar(self.view, orient=tk.VERTICAL, command=self._yview)
+        self.canvas.config(xscrollcommand=xbar.set, yscrollcommand=ybar.set)
+        self.canvas.grid(row=0, column=0, sticky=tk.NSEW)
+        xbar.grid(row=1, column=0, sticky=tk.EW)
+        ybar.grid(row=0, column=1, sticky=tk.NS)
+        self.view.rowconfigure(0, weight=1)
+        self.view.columnconfigure(0, weight=1)
 
         self.toolbar = ttk.Frame(self)
         self.toolbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -28,9 +65,14 @@ class MapEditor(tk.Tk):
         ttk.Label(self.toolbar, text="Districts").pack(pady=(5, 0))
         self.district_var = tk.IntVar(value=0)
         ttk.Spinbox(self.toolbar, from_=0, to=20, textvariable=self.district_var, width=5).pack(fill=tk.X)
+        self.district_mode_var = tk.StringVar(value=mg.DISTRICT_MODES[0])
+        ttk.OptionMenu(
+            self.toolbar, self.district_mode_var, self.district_mode_var.get(), *mg.DISTRICT_MODES
+        ).pack(fill=tk.X)
 
         self.element = tk.StringVar(value="rectangle")
         options = [
+            ("Select / Move", "select"),
             ("Rectangle Building", "rectangle"),
             ("Square Building", "square"),
             ("L Building", "l"),
@@ -47,71 +89,317 @@ class MapEditor(tk.Tk):
             self.toolbar,
             text="Political View",
             variable=self.political_var,
-            command=self.render_canvas,
+            command=self.update_political_view,
         ).pack(anchor=tk.W, pady=(5, 5))
 
-        ttk.Button(self.toolbar, text="Generate Map", command=self.generate_map).pack(fill=tk.X, pady=5)
-        ttk.Button(self.toolbar, text="Save", command=self.save_image).pack(fill=tk.X, pady=10)
+        zoom_bar = ttk.Frame(self.toolbar)
+        zoom_bar.pack(fill=tk.X)
+        ttk.Button(zoom_bar, text="-", width=3, command=lambda: self.zoom_by(-1)).pack(side=tk.LEFT)
+        self.zoom_var = tk.StringVar(value="100%")
+        ttk.Label(zoom_bar, textvariable=self.zoom_var, width=6, anchor=tk.CENTER).pack(side=tk.LEFT, expand=True)
+        ttk.Button(zoom_bar, text="+", width=3, command=lambda: self.zoom_by(1)).pack(side=tk.LEFT)
+        edit_bar = ttk.Frame(self.toolbar)
+        edit_bar.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(edit_bar, text="Undo", width=5, command=self.undo).pack(side=tk.LEFT)
+        ttk.Button(edit_bar, text="Redo", width=5, command=self.redo).pack(side=tk.LEFT)
+        ttk.Button(edit_bar, text="Delete", width=6, command=self.delete_selection).pack(side=tk.LEFT)
+
+        self.generate_button = ttk.Button(self.toolbar, text="Generate Map", command=self.generate_map)
+        self.generate_button.pack(fill=tk.X, pady=5)
+        self.cancel_button = ttk.Button(
+            self.toolbar, text="Cancel", command=self.cancel_generation, state=tk.DISABLED
+        )
+        self.cancel_button.pack(fill=tk.X)
+        self.progress = ttk.Progressbar(self.toolbar, maximum=1.0)
+        self.progress.pack(fill=tk.X, pady=(5, 0))
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.toolbar, textvariable=self.status_var).pack(anchor=tk.W)
+        ttk.Button(self.toolbar, text="Save", command=self.save_image).pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(self.toolbar, text="Open Project", command=self.open_project).pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(self.toolbar, text="Save Project", command=self.save_project).pack(fill=tk.X)
 
-        self.shapes = []  # list of shape dictionaries
+        self.data = MapData(self.width, self.height)
+        # Rendered layers reused by save_image and the raster underlay.
+        self.layer_cache = render.LayerCache()
+        self.items = {}  # canvas item id -> (layer, index into self.data)
+        self.view_items = {}  # (layer, index) -> canvas item id
+        self.district_items = []  # canvas item ids of districts, in drawing order
+        self.edits = MapEdits(self.data, VIEW_CHUNK)  # spatial index and undo log
+        self.selection = set()  # (layer, index) of the selected features
+        self.loaded_chunks = set()  # (col, row) squares whose items exist
+        self.underlay = None  # PhotoImage of the building raster
+        self._view_pending = False
         self.start_x = None
         self.start_y = None
         self.temp_shape = None
+        self.drag_offset = None  # (dx, dy) of the selection while dragging it
 
+        # State of a running background generation.
+        self.gen_thread = None
+        self.gen_queue = None
+        self.gen_cancel = None
+        self.gen_roads = None  # roads kept across the regeneration
+        self.road_network = None  # Voronoi diagram reused by later generations
+
+        self._configure_view()
+        self._reset_canvas()
         self.canvas.bind("<ButtonPress-1>", self.on_press)
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        # Pan by dragging with the middle button or scrolling, zoom with
+        # Ctrl and the wheel.
+        self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
+        self.canvas.bind("<B2-Motion>", self.on_pan)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Shift-MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Control-MouseWheel>", self.on_wheel)
+        for button in ("4", "5"):
+            for modifier in ("", "Shift-", "Control-"):
+                self.canvas.bind(f"<{modifier}Button-{button}>", self.on_wheel)
+        self.canvas.bind("<Configure>", lambda event: self.schedule_view_update())
+        # Edit keys act on the canvas only, so they keep their usual meaning
+        # in the toolbar's entry fields; clicking the canvas focuses it.
+        self.canvas.bind("<Delete>", lambda event: self.delete_selection())
+        self.canvas.bind("<BackSpace>", lambda event: self.delete_selection())
+        self.canvas.bind("<Escape>", lambda event: self.set_selection(()))
+        self.canvas.bind("<Control-z>", lambda event: self.undo())
+        self.canvas.bind("<Control-y>", lambda event: self.redo())
+        self.canvas.bind("<Control-Z>", lambda event: self.redo())
 
-    def render_canvas(self):
-        """Redraw all shapes according to the current political view setting."""
+    def _configure_view(self):
+        """Size the canvas widget and its scroll region for the map and zoom."""
+        self.canvas.config(
+            width=min(self.width, VIEW_WIDTH),
+            height=min(self.height, VIEW_HEIGHT),
+            scrollregion=(0, 0, self.width * self.zoom, self.height * self.zoom),
+        )
+
+    def _reset_canvas(self):
         self.canvas.delete("all")
-        for shape in self.shapes:
-            self._draw_shape(shape)
-
-    def _draw_shape(self, shape):
-        elem = shape["type"]
-        coords = shape["coords"]
-        if elem == "road":
-            self.canvas.create_line(coords, fill=mg.SHAPE_COLOR, width=3)
-        elif elem == "wall":
-            if isinstance(coords[0], (tuple, list)):
-                pts = coords + [coords[0]]
-                self.canvas.create_line(pts, fill=mg.SHAPE_COLOR, width=5)
-            else:
-                self.canvas.create_line(coords, fill=mg.SHAPE_COLOR, width=5)
-        elif elem == "river":
-            self.canvas.create_line(coords, fill="blue", width=4)
-        elif elem == "district":
-            if isinstance(coords[0], (tuple, list)):
-                if self.political_var.get() and "color" in shape:
-                    self.canvas.create_polygon(
-                        coords, outline="gray", fill=shape["color"], width=2
-                    )
-                else:
-                    self.canvas.create_polygon(coords, outline="gray", width=2)
-            else:
-                if self.political_var.get() and "color" in shape:
-                    self.canvas.create_rectangle(
-                        coords, outline="gray", fill=shape["color"], width=2
-                    )
-                else:
-                    self.canvas.create_rectangle(coords, outline="gray", width=2)
-        elif elem == "polygon":
-            if isinstance(coords[0], (tuple, list)):
-                self.canvas.create_polygon(coords, fill=mg.SHAPE_COLOR)
-            else:
-                x1, y1, x2, y2 = coords
-                box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-                poly = mg.random_polygon_from_box(box)
-                self.canvas.create_polygon(poly, fill=mg.SHAPE_COLOR)
-        else:
+        self.items.clear()
+        self.view_items.clear()
+        self.district_items.clear()
+        self.loaded_chunks.clear()
+        self.underlay = None
+        # A hidden marker above the items of each layer keeps the canvas
+        # stacked in render order however the items are added.
+        for layer in LAYERS:
+            self.canvas.create_line(0, 0, 0, 0, state=tk.HIDDEN, tags=("top:" + layer,))
+
+    def render_canvas(self):
+        """Recreate the canvas items of the visible shapes from scratch."""
+        self._reset_canvas()
+        self._update_underlay()
+        self.update_view()
+
+    def _set_data(self, data):
+        """Make ``data`` the current map and index it for the view."""
+        self.data = data
+        self.edits = MapEdits(data, VIEW_CHUNK)
+        self.selection = set()
+        self.render_canvas()
+
+    def visible_region(self):
+        """Return the ``(x1, y1, x2, y2)`` map area shown by the canvas."""
+        canvas = self.canvas
+        x1 = canvas.canvasx(0) / self.zoom
+        y1 = canvas.canvasy(0) / self.zoom
+        x2 = canvas.canvasx(canvas.winfo_width()) / self.zoom
+        y2 = canvas.canvasy(canvas.winfo_height()) / self.zoom
+        return x1, y1, x2, y2
+
+    def schedule_view_update(self):
+        """Update the view once the event loop is idle, at most once per batch of events."""
+        if not self._view_pending:
+            self._view_pending = True
+            self.after_idle(self.update_view)
+
+    def update_view(self):
+        """Create the items of the shapes in squares that came into view."""
+        self._view_pending = False
+        x1, y1, x2, y2 = self.visible_region()
+        cols = range(max(0, int(x1) // VIEW_CHUNK), min(self.width, int(x2)) // VIEW_CHUNK + 1)
+        rows = range(max(0, int(y1) // VIEW_CHUNK), min(self.height, int(y2)) // VIEW_CHUNK + 1)
+        chunks = {(col, row) for col in cols for row in rows} - self.loaded_chunks
+        if not chunks:
+            return
+        if len(self.loaded_chunks) + len(chunks) > MAX_VIEW_CHUNKS:
+            # Start over from the visible squares to bound the item count.
+            self.canvas.delete("feature")
+            self.items.clear()
+            self.view_items.clear()
+            self.district_items.clear()
+            self.loaded_chunks.clear()
+            chunks = {(col, row) for col in cols for row in rows}
+        rasterized = self.zoom < RASTER_ZOOM
+        found = set()
+        for col, row in chunks:
+            x, y = col * VIEW_CHUNK, row * VIEW_CHUNK
+            found.update(self.edits.query((x, y, x + VIEW_CHUNK, y + VIEW_CHUNK)))
+        self.loaded_chunks |= chunks
+        for key in sorted(found):
+            if key in self.view_items or (rasterized and key[0] == "buildings"):
+                continue
+            self._add_item(*key)
+
+    def _update_underlay(self):
+        """Show the buildings as one image when zoomed out past :data:`RASTER_ZOOM`."""
+        self.canvas.delete("underlay")
+        self.underlay = None
+        if self.zoom >= RASTER_ZOOM:
+            return
+        cached = self.layer_cache.mask(self.data, "buildings", self.edits.removals())
+        if cached is None:
+            return
+        mask, (x1, y1, x2, y2) = cached
+        factor = round(1 / self.zoom)
+        # Align the mask to whole screen pixels before averaging it down.
+        ax, ay = x1 - x1 % factor, y1 - y1 % factor
+        alpha = Image.new("L", (x2 - ax, y2 - ay))
+        alpha.paste(mask, (x1 - ax, y1 - ay))
+        alpha = alpha.reduce(factor)
+        img = Image.new("RGBA", alpha.size, mg.SHAPE_COLOR)
+        img.putalpha(alpha)
+        self.underlay = ImageTk.PhotoImage(img)
+        item = self.canvas.create_image(
+            ax // factor, ay // factor, image=self.underlay, anchor=tk.NW, tags=("underlay",)
+        )
+        self.canvas.tag_raise(item, "top:districts")
+
+    def zoom_by(self, steps, x=None, y=None):
+        """Zoom ``steps`` levels in (or out if negative) around a canvas point."""
+        level = ZOOM_LEVELS.index(self.zoom) + steps
+        self.set_zoom(ZOOM_LEVELS[max(0, min(level, len(ZOOM_LEVELS) - 1))], x, y)
+
+    def set_zoom(self, zoom, x=None, y=None):
+        """Set the zoom, keeping the map point under window position ``x, y`` in place."""
+        if zoom == self.zoom:
+            return
+        if x is None:
+            x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        mx = self.canvas.canvasx(x) / self.zoom
+        my = self.canvas.canvasy(y) / self.zoom
+        self.zoom = zoom
+        self.zoom_var.set(f"{zoom:.0%}")
+        self._configure_view()
+        self.canvas.xview_moveto(max(0.0, (mx * zoom - x) / (self.width * zoom)))
+        self.canvas.yview_moveto(max(0.0, (my * zoom - y) / (self.height * zoom)))
+        self.render_canvas()
+        self._draw_selection()
+
+    def _xview(self, *args):
+        self.canvas.xview(*args)
+        self.schedule_view_update()
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self.schedule_view_update()
+
+    def on_pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
+
+    def on_pan(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.schedule_view_update()
+
+    def on_wheel(self, event):
+        # Windows and macOS report a delta, X11 sends buttons 4 and 5.
+        up = getattr(event, "delta", 0) > 0 or getattr(event, "num", None) == 4
+        if event.state & 0x0004:  # Control
+            self.zoom_by(1 if up else -1, event.x, event.y)
+            return
+        view = self.canvas.xview_scroll if event.state & 0x0001 else self.canvas.yview_scroll  # Shift
+        view(-1 if up else 1, "units")
+        self.schedule_view_update()
+
+    def update_political_view(self):
+        """Refill the existing district items for the political view setting."""
+        for item in self.district_items:
+            self.canvas.itemconfig(item, fill=self._district_fill(self.items[item][1]))
+
+    def _add_item(self, layer, index):
+        item = self._draw_item(layer, index)
+        self.canvas.itemconfig(item, tags=("feature",))
+        self.canvas.tag_lower(item, "top:" + layer)
+        self.items[item] = (layer, index)
+        self.view_items[(layer, index)] = item
+        if layer == "districts":
+            self.district_items.append(item)
+        return item
+
+    def _district_fill(self, index):
+        if self.political_var.get():
+            return mg.DISTRICT_COLORS[self.data.district_colors[index]]
+        return ""
+
+    def _draw_item(self, layer, index):
+        """Create the canvas item of one feature and return its id.
+
+        Items are styled like :func:`mapmaker.render.render_image` draws the
+        feature, so what is on screen matches the exported image, and scaled
+        by the current zoom.
+        """
+        data = self.data
+        zoom = self.zoom
+
+        def scaled(coords):
+            return [v * zoom for v in coords]
+
+        def width(pixels):
+            return max(1, round(pixels * zoom))
+
+        if layer == "roads":
+            return self.canvas.create_line(
+                scaled(data.roads[index].tolist()), fill=render.ROAD_COLOR, width=width(render.ROAD_WIDTH)
+            )
+        elif layer == "rivers":
+            return self.canvas.create_line(
+                scaled(data.rivers[index].tolist()), fill=render.RIVER_COLOR, width=width(render.RIVER_WIDTH)
+            )
+        elif layer == "walls":
+            pts = scaled(data.walls[index].ravel().tolist())
+            return self.canvas.create_line(pts + pts[:2], fill=render.WALL_COLOR, width=width(render.WALL_WIDTH))
+        elif layer == "districts":
+            return self.canvas.create_polygon(
+                scaled(data.districts[index].ravel().tolist()),
+                outline=render.DISTRICT_OUTLINE,
+                fill=self._district_fill(index),
+                width=width(render.DISTRICT_OUTLINE_WIDTH),
+            )
+        shape_type, shape_data = data.building(index)
+        if shape_type == "polygon":
+            return self.canvas.create_polygon(scaled(sum(shape_data, ())), fill=mg.SHAPE_COLOR)
+        elif shape_type == "l":
+            outline = render.l_shape_outline(shape_data)
+            return self.canvas.create_polygon(scaled(sum(outline, ())), fill=mg.SHAPE_COLOR)
+        return self.canvas.create_rectangle(scaled(shape_data), outline=mg.SHAPE_COLOR, fill=mg.SHAPE_COLOR)
+
+    def add_shape(self, elem, coords):
+        """Add a dragged ``(x1, y1, x2, y2)`` as a toolbar element to the map.
+
+        Boxes are normalized, and polygon buildings and district colors are
+        drawn once here so later redraws and exports stay identical. Returns
+        the ``(layer, index)`` of the new feature.
+        """
+        if elem in ("road", "river"):
+            layer = elem + "s"
+            return layer, self.data.append_segment(layer, coords)
+        if elem == "wall":
             x1, y1, x2, y2 = coords
-            if elem == "square":
-                side = min(abs(x2 - x1), abs(y2 - y1))
-                x2 = x1 + side if x2 > x1 else x1 - side
-                y2 = y1 + side if y2 > y1 else y1 - side
-            box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-            self.canvas.create_rectangle(box, outline=mg.SHAPE_COLOR)
+            return "walls", self.data.append_wall([(x1, y1), (x2, y2)])
+        x1, y1, x2, y2 = coords
+        if elem == "square":
+            side = min(abs(x2 - x1), abs(y2 - y1))
+            x2 = x1 + side if x2 > x1 else x1 - side
+            y2 = y1 + side if y2 > y1 else y1 - side
+        box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        if elem == "district":
+            bx1, by1, bx2, by2 = box
+            poly = [(bx1, by1), (bx2, by1), (bx2, by2), (bx1, by2)]
+            return "districts", self.data.append_district(poly, random.choice(mg.DISTRICT_COLORS))
+        if elem == "polygon":
+            return "buildings", self.data.append_building(elem, box, mg.random_polygon_from_box(box))
+        return "buildings", self.data.append_building(elem, box)
 
     def on_resolution_select(self, value):
         if value in mg.RESOLUTION_PRESETS:
@@ -119,126 +407,282 @@ class MapEditor(tk.Tk):
             if mg.validate_resolution(w, h):
                 self.width = w
                 self.height = h
-                self.canvas.config(width=w, height=h)
+                self.data.width, self.data.height = w, h
+                self._configure_view()
+                self.render_canvas()
         self.res_var.set(value)
 
+    def _map_point(self, event):
+        """Return the map position under a mouse event."""
+        return (
+            round(self.canvas.canvasx(event.x) / self.zoom),
+            round(self.canvas.canvasy(event.y) / self.zoom),
+        )
+
     def on_press(self, event):
-        self.start_x = event.x
-        self.start_y = event.y
+        self.canvas.focus_set()
+        if self.generating:
+            return
+        self.drag_offset = None
+        self.start_x, self.start_y = self._map_point(event)
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
         elem = self.element.get()
+        if elem == "select":
+            self._press_select(event)
+            return
         if elem in ("rectangle", "square", "l", "polygon", "district"):
-            self.temp_shape = self.canvas.create_rectangle(event.x, event.y, event.x, event.y, outline=mg.SHAPE_COLOR)
+            self.temp_shape = self.canvas.create_rectangle(x, y, x, y, outline=mg.SHAPE_COLOR)
         else:
-            self.temp_shape = self.canvas.create_line(event.x, event.y, event.x, event.y, fill=mg.SHAPE_COLOR, width=3)
+            self.temp_shape = self.canvas.create_line(x, y, x, y, fill=mg.SHAPE_COLOR, width=3)
 
     def on_drag(self, event):
+        if self.drag_offset is not None:
+            self._drag_selection(event)
+            return
         if not self.temp_shape:
             return
-        if self.element.get() in ("rectangle", "square", "l", "polygon", "district"):
-            self.canvas.coords(self.temp_shape, self.start_x, self.start_y, event.x, event.y)
-        else:
-            self.canvas.coords(self.temp_shape, self.start_x, self.start_y, event.x, event.y)
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        self.canvas.coords(self.temp_shape, self.start_x * self.zoom, self.start_y * self.zoom, x, y)
 
     def on_release(self, event):
+        if self.drag_offset is not None:
+            dx, dy = self.drag_offset
+            self.drag_offset = None
+            if dx or dy:
+                self.edits.move(sorted(self.selection), dx, dy)
+                self._refresh(self.selection)
+            return
         if not self.temp_shape:
             return
-        elem = self.element.get()
-        coords = (self.start_x, self.start_y, event.x, event.y)
-        shape = {"type": elem, "coords": coords}
-        if elem == "district":
-            shape["color"] = random.choice(mg.DISTRICT_COLORS)
-        self.shapes.append(shape)
+        coords = (self.start_x, self.start_y, *self._map_point(event))
+        layer, index = self.add_shape(self.element.get(), coords)
+        self.canvas.delete(self.temp_shape)
         self.temp_shape = None
-        self.render_canvas()
+        self.edits.add(layer, index)
+        if layer == "buildings" and self.zoom < RASTER_ZOOM:
+            self._update_underlay()
+        else:
+            self._add_item(layer, index)
+
+    def _press_select(self, event):
+        """Select the feature under the mouse and start dragging the selection."""
+        key = self.edits.hit_test(self.start_x, self.start_y, HIT_TOLERANCE / self.zoom)
+        if event.state & 0x0001:  # Shift toggles a feature in the selection.
+            if key is not None:
+                self.set_selection(self.selection ^ {key})
+            return
+        if key not in self.selection:
+            self.set_selection([key] if key is not None else ())
+        if self.selection:
+            self.drag_offset = (0, 0)
+
+    def _drag_selection(self, event):
+        x, y = self._map_point(event)
+        dx, dy = x - self.start_x, y - self.start_y
+        step_x, step_y = dx - self.drag_offset[0], dy - self.drag_offset[1]
+        if not step_x and not step_y:
+            return
+        self.drag_offset = (dx, dy)
+        moving = [self.view_items[key] for key in self.selection if key in self.view_items]
+        for item in moving + ["selection"]:
+            self.canvas.move(item, step_x * self.zoom, step_y * self.zoom)
+
+    def set_selection(self, keys):
+        """Select the features ``keys`` and outline them."""
+        self.selection = set(keys)
+        self._draw_selection()
+
+    def _draw_selection(self):
+        self.canvas.delete("selection")
+        zoom = self.zoom
+        for layer, index in self.selection:
+            x1, y1, x2, y2 = feature_bounds(self.data, layer, index)
+            self.canvas.create_rectangle(
+                x1 * zoom,
+                y1 * zoom,
+                x2 * zoom,
+                y2 * zoom,
+                outline=SELECTION_COLOR,
+                dash=(4, 2),
+                tags=("selection",),
+            )
+
+    def _refresh(self, keys):
+        """Redraw the features ``keys`` after they were edited."""
+        rasterized = self.zoom < RASTER_ZOOM
+        for key in keys:
+            item = self.view_items.pop(key, None)
+            if item is not None:
+                self.canvas.delete(item)
+                del self.items[item]
+                if key[0] == "districts":
+                    self.district_items.remove(item)
+            if key not in self.edits.removed and not (rasterized and key[0] == "buildings"):
+                self._add_item(*key)
+        if rasterized and any(layer == "buildings" for layer, _ in keys):
+            self._update_underlay()
+        self.selection -= self.edits.removed
+        self._draw_selection()
+
+    def delete_selection(self):
+        """Delete the selected features."""
+        if self.generating or not self.selection:
+            return
+        keys = sorted(self.selection)
+        self.edits.delete(keys)
+        self._refresh(keys)
+
+    def undo(self):
+        if not self.generating:
+            self._refresh(self.edits.undo())
+
+    def redo(self):
+        if not self.generating:
+            self._refresh(self.edits.redo())
 
     def save_image(self):
-        path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG", "*.png")])
+        path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG", "*.png"), ("WebP (lossless)", "*.webp"), ("TIFF", "*.tif *.tiff")],
+        )
         if not path:
             return
-        img = Image.new("RGB", (self.width, self.height), mg.BG_COLOR)
-        draw = ImageDraw.Draw(img)
-        for shape in self.shapes:
-            elem = shape["type"]
-            coords = shape["coords"]
-            if elem == "road":
-                draw.line(coords, fill=mg.SHAPE_COLOR, width=3)
-            elif elem == "wall":
-                if isinstance(coords[0], (tuple, list)):
-                    pts = coords + [coords[0]]
-                    draw.line(pts, fill=mg.SHAPE_COLOR, width=5)
-                else:
-                    draw.line(coords, fill=mg.SHAPE_COLOR, width=5)
-            elif elem == "river":
-                draw.line(coords, fill="blue", width=4)
-            elif elem == "district":
-                if isinstance(coords[0], (tuple, list)):
-                    if self.political_var.get() and "color" in shape:
-                        draw.polygon(coords, outline="gray", fill=shape["color"], width=2)
-                    else:
-                        draw.polygon(coords, outline="gray", width=2)
-                else:
-                    if self.political_var.get() and "color" in shape:
-                        draw.rectangle(
-                            coords, outline="gray", fill=shape["color"], width=2
-                        )
-                    else:
-                        draw.rectangle(coords, outline="gray", width=2)
-            else:
-                x1, y1, x2, y2 = coords
-                if elem == "square":
-                    side = min(abs(x2 - x1), abs(y2 - y1))
-                    x2 = x1 + side if x2 > x1 else x1 - side
-                    y2 = y1 + side if y2 > y1 else y1 - side
-                    box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-                    draw.rectangle(box, fill=mg.SHAPE_COLOR)
-                elif elem == "rectangle":
-                    box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-                    draw.rectangle(box, fill=mg.SHAPE_COLOR)
-                elif elem == "l":
-                    box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-                    mg.draw_l_shape(draw, box)
-                elif elem == "polygon":
-                    box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
-                    poly = mg.random_polygon_from_box(box)
-                    mg.draw_polygon(draw, poly)
-        img.save(path)
+        img = self.layer_cache.render(self.data, self.political_var.get(), self.edits.removals())
+        render.save_image(img, path)
+
+    def open_project(self):
+        """Replace the map with one loaded from a project file."""
+        if self.generating:
+            return
+        path = filedialog.askopenfilename(filetypes=[("MapMaker project", "*" + PROJECT_EXTENSION)])
+        if not path:
+            return
+        try:
+            data = load_project(path)
+        except (OSError, ValueError) as exc:
+            self.status_var.set(f"Failed: {exc}")
+            return
+        self.width = data.width
+        self.height = data.height
+        self.res_var.set("Custom")
+        self._configure_view()
+        self._show_data(data)
+
+    def save_project(self):
+        """Write the map data to a project file."""
+        path = filedialog.asksaveasfilename(
+            defaultextension=PROJECT_EXTENSION,
+            filetypes=[("MapMaker project", "*" + PROJECT_EXTENSION)],
+        )
+        if not path:
+            return
+        save_project(self.edits.compact(), path)
+        self.status_var.set(f"Saved {path}")
+
+    @property
+    def generating(self):
+        """True while a map is generated in the background."""
+        return self.gen_thread is not None
 
     def generate_map(self):
-        self.canvas.delete("all")
-        road_points = []
-        original_roads = []
-        for shape in self.shapes:
-            if shape["type"] == "road":
-                x1, y1, x2, y2 = shape["coords"]
-                road_points.append((x1, y1))
-                road_points.append((x2, y2))
-                original_roads.append(shape)
-        self.shapes.clear()
-        data = mg.generate_map_data(
-            self.width,
-            self.height,
-            num_shapes=10,
-            num_districts=self.district_var.get(),
-            num_walls=1,
-            road_points=road_points,
+        """Start generating a map in a background thread."""
+        if self.generating:
+            return
+        roads = self.edits.compact().roads.copy()
+        # Connected roads share endpoints; each point is one Voronoi seed.
+        road_points = list(dict.fromkeys(tuple(point) for point in roads.reshape(-1, 2).tolist()))
+        if road_points and self.road_network is None:
+            from .roads import RoadNetwork
+
+            self.road_network = RoadNetwork()
+        # Tk variables may only be read on the main thread.
+        params = {
+            "num_shapes": 10,
+            "num_districts": self.district_var.get(),
+            "district_mode": self.district_mode_var.get(),
+            "num_walls": 1,
+            "road_points": road_points,
+            "road_network": self.road_network,
+        }
+        self.gen_queue = queue.Queue()
+        self.gen_cancel = threading.Event()
+        self.gen_thread = threading.Thread(
+            target=self._generate_worker,
+            args=(self.width, self.height, params, self.gen_queue, self.gen_cancel),
+            daemon=True,
         )
-        for dist in data["districts"]:
-            shape = {"type": "district", "coords": dist["poly"], "color": dist["color"]}
-            self.shapes.append(shape)
-        for wall in data["walls"]:
-            shape = {"type": "wall", "coords": wall}
-            self.shapes.append(shape)
-        self.shapes.extend(original_roads)
-        for line in data["roads"]:
-            shape = {"type": "road", "coords": line}
-            self.shapes.append(shape)
-        for shape_type, shape_data in data["buildings"]:
-            if shape_type == "polygon":
-                shape = {"type": "polygon", "coords": shape_data}
+        self.gen_roads = roads
+        self.generate_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.progress["value"] = 0
+        self.status_var.set("Generating...")
+        self.gen_thread.start()
+        self.after(POLL_INTERVAL, self._poll_generation)
+
+    @staticmethod
+    def _generate_worker(width, height, params, results, cancel):
+        """Run generate_map_data and post its outcome. Runs off the main thread."""
+
+        def progress(stage, fraction):
+            if cancel.is_set():
+                raise mg.GenerationCancelled()
+            results.put(("progress", stage, fraction))
+
+        try:
+            data = mg.generate_map_data(width, height, progress=progress, **params)
+        except mg.GenerationCancelled:
+            results.put(("cancelled",))
+        except Exception as exc:
+            results.put(("error", exc))
+        else:
+            results.put(("done", data))
+
+    def cancel_generation(self):
+        """Stop a running generation."""
+        if self.gen_cancel is not None:
+            self.gen_cancel.set()
+
+    def _poll_generation(self):
+        while True:
+            try:
+                message = self.gen_queue.get_nowait()
+            except queue.Empty:
+                break
+            kind = message[0]
+            if kind == "progress":
+                _, stage, fraction = message
+                self.status_var.set(f"Generating {stage}...")
+                self.progress["value"] = fraction
+                continue
+            self.gen_thread = None
+            self.gen_cancel = None
+            if kind == "done":
+                self._load_generated(message[1])
+            elif kind == "cancelled":
+                self._finish_generation("Cancelled")
             else:
-                shape = {"type": shape_type, "coords": shape_data}
-            self.shapes.append(shape)
-        self.render_canvas()
+                self._finish_generation(f"Failed: {message[1]}")
+            return
+        self.after(POLL_INTERVAL, self._poll_generation)
+
+    def _load_generated(self, data):
+        """Replace the current map with a generated one."""
+        data.roads = np.concatenate([self.gen_roads, data.roads])
+        data.touch("roads")
+        self.gen_roads = None
+        self._show_data(data)
+
+    def _show_data(self, data):
+        """Make ``data`` the current map and draw the visible part of it."""
+        self._set_data(data)
+        total = sum(data.count(layer) for layer in LAYERS)
+        self._finish_generation(f"{total} shapes" if total else "Empty map")
+
+    def _finish_generation(self, status):
+        self.generate_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress["value"] = 0
+        self.status_var.set(status)
 
 
 def main(argv=None):
@@ -0,0 +1,308 @@
+"""Compact array-backed storage for map data.
+
+A :class:`MapData` keeps every layer as a few NumPy arrays instead of one
+Python object per feature: int32 boxes and road segments, a uint8 shape
+type code per building and ragged polygons stored as one flat coordinate
+array plus offsets (:class:`Polygons`).
+"""
+
+import numpy as np
+
+from .generator import DISTRICT_COLORS
+
+# Drawing order of the layers, bottom to top.
+LAYERS = ("districts", "buildings", "roads", "rivers", "walls")
+
+# Building shape types and the codes stored in MapData.building_types.
+SHAPE_TYPES = ("square", "rectangle", "l", "polygon")
+SQUARE, RECTANGLE, L_SHAPE, POLYGON = range(len(SHAPE_TYPES))
+
+
+def _array(values, dtype, width=None):
+    if values is None:
+        values = ()
+    array = np.asarray(values, dtype=dtype)
+    if width is not None:
+        array = array.reshape(-1, width)
+    return array
+
+
+class Polygons:
+    """Ragged list of polygons.
+
+    The points of polygon ``i`` are ``coords[offsets[i]:offsets[i + 1]]``,
+    so a polygon may have no points at all.
+    """
+
+    def __init__(self, coords=None, offsets=None):
+        self.coords = _array(coords, np.int32, 2)
+        self.offsets = _array(offsets if offsets is not None else (0,), np.int64)
+
+    @classmethod
+    def from_lists(cls, polygons):
+        """Build from a sequence of ``[(x, y), ...]`` point lists."""
+        counts = [len(points) for points in polygons]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        coords = [point for points in polygons for point in points]
+        return cls(coords, offsets)
+
+    @classmethod
+    def empty(cls, count):
+        """Return ``count`` polygons without points."""
+        return cls(None, np.zeros(count + 1, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.coords[self.offsets[index] : self.offsets[index + 1]]
+
+    def points(self, index):
+        """Return polygon ``index`` as a list of ``(x, y)`` tuples."""
+        return [tuple(point) for point in self[index].tolist()]
+
+    def to_lists(self):
+        return [self.points(i) for i in range(len(self))]
+
+    def sizes(self):
+        return np.diff(self.offsets)
+
+    def bounds(self):
+        """Return the ``(n, 4)`` bounding boxes; empty polygons get zeros."""
+        result = np.zeros((len(self), 4), dtype=np.int32)
+        filled = np.flatnonzero(self.sizes() > 0)
+        if len(filled):
+            starts = self.offsets[:-1][filled]
+            result[filled, :2] = np.minimum.reduceat(self.coords, starts)
+            result[filled, 2:] = np.maximum.reduceat(self.coords, starts)
+        return result
+
+    def append(self, points):
+        """Add one polygon and return its index."""
+        points = _array(points, np.int32, 2)
+        self.coords = np.concatenate([self.coords, points])
+        self.offsets = np.append(self.offsets, self.offsets[-1] + len(points))
+        return len(self) - 1
+
+    def take(self, indices):
+        """Return a new Polygons holding only ``indices``, in that order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[:-1][indices]
+        counts = self.sizes()[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Position of every kept point inside self.coords.
+        picks = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return Polygons(self.coords[picks], offsets)
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.offsets.nbytes
+
+
+def building_arrays(shapes):
+    """Convert ``(shape_type, box_or_points)`` buildings to MapData arrays.
+
+    Returns ``(types, boxes, polygons)``; polygon buildings get the bounding
+    box of their vertices.
+    """
+    types = np.zeros(len(shapes), dtype=np.uint8)
+    boxes = np.zeros((len(shapes), 4), dtype=np.int32)
+    polygons = []
+    for i, (shape_type, shape_data) in enumerate(shapes):
+        types[i] = SHAPE_TYPES.index(shape_type)
+        if shape_type == "polygon":
+            xs = [p[0] for p in shape_data]
+            ys = [p[1] for p in shape_data]
+            boxes[i] = min(xs), min(ys), max(xs), max(ys)
+            polygons.append(shape_data)
+        else:
+            boxes[i] = shape_data
+            polygons.append(())
+    return types, boxes, Polygons.from_lists(polygons)
+
+
+def spread_polygons(types, coords, offsets):
+    """Give every building a polygon slot.
+
+    ``coords``/``offsets`` hold only the polygon buildings, in order; the
+    result has an empty polygon for every other building.
+    """
+    counts = np.zeros(len(types), dtype=np.int64)
+    counts[types == POLYGON] = np.diff(offsets)
+    spread = np.zeros(len(types) + 1, dtype=np.int64)
+    np.cumsum(counts, out=spread[1:])
+    return Polygons(coords, spread)
+
+
+class MapData:
+    """A generated map stored as struct-of-arrays.
+
+    Buildings are ``building_types`` (uint8 codes into :data:`SHAPE_TYPES`),
+    ``building_boxes`` (int32 ``x1, y1, x2, y2``) and ``building_polygons``
+    holding the vertices of polygon buildings (empty for the others).
+    Roads and rivers are int32 segments, districts and walls are
+    :class:`Polygons` and ``district_colors`` index :data:`DISTRICT_COLORS`.
+
+    Indexing with a layer name (``data["buildings"]``) returns the layer in
+    the list-of-tuples form older code expects.
+    """
+
+    def __init__(
+        self,
+        width,
+        height,
+        building_types=None,
+        building_boxes=None,
+        building_polygons=None,
+        roads=None,
+        rivers=None,
+        districts=None,
+        district_colors=None,
+        walls=None,
+    ):
+        self.width = width
+        self.height = height
+        self.building_types = _array(building_types, np.uint8)
+        self.building_boxes = _array(building_boxes, np.int32, 4)
+        if building_polygons is None:
+            building_polygons = Polygons.empty(len(self.building_types))
+        self.building_polygons = building_polygons
+        self.roads = _array(roads, np.int32, 4)
+        self.rivers = _array(rivers, np.int32, 4)
+        self.districts = districts if districts is not None else Polygons()
+        self.district_colors = _array(district_colors, np.uint8)
+        self.walls = walls if walls is not None else Polygons()
+        # Bumped whenever a layer changes, so cached renders can tell.
+        self.versions = dict.fromkeys(LAYERS, 0)
+
+    @classmethod
+    def from_dict(cls, data, width, height):
+        """Convert the ``generate_map_data`` dictionary format."""
+        types, boxes, polygons = building_arrays(data.get("buildings", ()))
+        districts = data.get("districts", ())
+        return cls(
+            width,
+            height,
+            building_types=types,
+            building_boxes=boxes,
+            building_polygons=polygons,
+            roads=data.get("roads"),
+            rivers=data.get("rivers"),
+            districts=Polygons.from_lists([d["poly"] for d in districts]),
+            district_colors=[DISTRICT_COLORS.index(d["color"]) for d in districts],
+            walls=Polygons.from_lists(list(data.get("walls", ()))),
+        )
+
+    def count(self, layer):
+        """Return the number of features in ``layer``."""
+        if layer == "buildings":
+            return len(self.building_types)
+        return len(getattr(self, layer))
+
+    def building(self, index):
+        """Return building ``index`` as ``(shape_type, box_or_points)``."""
+        code = int(self.building_types[index])
+        if code == POLYGON:
+            return SHAPE_TYPES[code], self.building_polygons.points(index)
+        return SHAPE_TYPES[code], tuple(self.building_boxes[index].tolist())
+
+    def district(self, index):
+        """Return district ``index`` as ``{"poly": points, "color": color}``."""
+        color = DISTRICT_COLORS[int(self.district_colors[index])]
+        return {"poly": self.districts.points(index), "color": color}
+
+    def __getitem__(self, layer):
+        if layer == "buildings":
+            return [self.building(i) for i in range(self.count("buildings"))]
+        if layer == "districts":
+            return [self.district(i) for i in range(self.count("districts"))]
+        if layer in ("roads", "rivers"):
+            return [tuple(segment) for segment in getattr(self, layer).tolist()]
+        if layer == "walls":
+            return self.walls.to_lists()
+        raise KeyError(layer)
+
+    def to_dict(self):
+        """Return the map in the ``generate_map_data`` dictionary format."""
+        return {layer: self[layer] for layer in ("buildings", "roads", "rivers", "districts", "walls")}
+
+    def bounds(self, layer):
+        """Return an ``(n, 4)`` array with the bounding box of every feature."""
+        if layer == "buildings":
+            return self.building_boxes
+        if layer in ("roads", "rivers"):
+            segments = getattr(self, layer)
+            return np.concatenate(
+                [
+                    np.minimum(segments[:, :2], segments[:, 2:]),
+                    np.maximum(segments[:, :2], segments[:, 2:]),
+                ],
+                axis=1,
+            )
+        return getattr(self, layer).bounds()
+
+    def touch(self, layer):
+        """Mark ``layer`` as changed; call after replacing its arrays."""
+        self.versions[layer] += 1
+
+    def append_building(self, shape_type, box, points=()):
+        """Add a building and return its index."""
+        self.touch("buildings")
+        self.building_types = np.append(self.building_types, np.uint8(SHAPE_TYPES.index(shape_type)))
+        self.building_boxes = np.concatenate([self.building_boxes, _array(box, np.int32, 4)])
+        return self.building_polygons.append(points)
+
+    def append_segment(self, layer, segment):
+        """Add a road or river segment and return its index."""
+        self.touch(layer)
+        setattr(self, layer, np.concatenate([getattr(self, layer), _array(segment, np.int32, 4)]))
+        return self.count(layer) - 1
+
+    def append_district(self, points, color):
+        """Add a district polygon with a :data:`DISTRICT_COLORS` entry."""
+        self.touch("districts")
+        self.district_colors = np.append(self.district_colors, np.uint8(DISTRICT_COLORS.index(color)))
+        return self.districts.append(points)
+
+    def append_wall(self, points):
+        """Add a wall polyline and return its index."""
+        self.touch("walls")
+        return self.walls.append(points)
+
+    def take(self, selection):
+        """Return a new MapData with only the selected features.
+
+        ``selection`` maps layer names to index arrays; missing layers are
+        left empty.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        b = np.asarray(selection.get("buildings", empty), dtype=np.int64)
+        d = np.asarray(selection.get("districts", empty), dtype=np.int64)
+        return MapData(
+            self.width,
+            self.height,
+            building_types=self.building_types[b],
+            building_boxes=self.building_boxes[b],
+            building_polygons=self.building_polygons.take(b),
+            roads=self.roads[np.asarray(selection.get("roads", empty), dtype=np.int64)],
+            rivers=self.rivers[np.asarray(selection.get("rivers", empty), dtype=np.int64)],
+            districts=self.districts.take(d),
+            district_colors=self.district_colors[d],
+            walls=self.walls.take(np.asarray(selection.get("walls", empty), dtype=np.int64)),
+        )
+
+    @property
+    def nbytes(self):
+        """Total size of the backing arrays in bytes."""
+        return (
+            self.building_types.nbytes
+            + self.building_boxes.nbytes
+            + self.building_polygons.nbytes
+            + self.roads.nbytes
+            + self.rivers.nbytes
+            + self.districts.nbytes
+            + self.district_colors.nbytes
+            + self.walls.nbytes
+        )
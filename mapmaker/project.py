@@ -0,0 +1,115 @@
+"""Save and load map data as a binary project file.
+
+A project file is an 8 byte magic string, a little-endian uint32 header
+length and a JSON header, followed by the raw arrays of a
+:class:`~mapmaker.mapdata.MapData`. Every array starts on a
+:data:`ALIGNMENT` byte boundary so :func:`load_project` can map the file
+into memory and view the arrays in place instead of parsing them.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from .mapdata import MapData, Polygons
+
+MAGIC = b"MAPMAKER"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PROJECT_EXTENSION = ".mapdata"
+
+# MapData attributes stored in a project; Polygons are split in two arrays.
+ARRAYS = ("building_types", "building_boxes", "roads", "rivers", "district_colors")
+POLYGONS = ("building_polygons", "districts", "walls")
+
+
+def _arrays(data):
+    for name in ARRAYS:
+        yield name, getattr(data, name)
+    for name in POLYGONS:
+        polygons = getattr(data, name)
+        yield name + ".coords", polygons.coords
+        yield name + ".offsets", polygons.offsets
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_project(data, path):
+    """Write ``data`` to ``path`` in the project format.
+
+    The file is written under a temporary name and then moved into place,
+    so ``data`` may still be memory-mapped from ``path`` itself.
+    """
+    arrays = []
+    entries = {}
+    offset = 0
+    for name, array in _arrays(data):
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+        entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        arrays.append(array)
+        offset = _align(offset + array.nbytes)
+    header = {
+        "version": FORMAT_VERSION,
+        "width": data.width,
+        "height": data.height,
+        "arrays": entries,
+    }
+    header = json.dumps(header).encode()
+    start = _align(len(MAGIC) + 4 + len(header))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(MAGIC)
+            fh.write(struct.pack("<I", len(header)))
+            fh.write(header)
+            for array, entry in zip(arrays, entries.values()):
+                fh.seek(start + entry["offset"])
+                fh.write(array.data)
+            # Pad the file so the last array's alignment gap is present too.
+            fh.truncate(start + offset)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_header(path):
+    """Return the JSON header of a project file and where its data starts."""
+    with open(path, "rb") as fh:
+        if fh.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a MapMaker project file")
+        (size,) = struct.unpack("<I", fh.read(4))
+        header = json.loads(fh.read(size))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported project version {header.get('version')!r}")
+    return header, _align(len(MAGIC) + 4 + size)
+
+
+def load_project(path, mmap=True):
+    """Load a project file as a :class:`~mapmaker.mapdata.MapData`.
+
+    By default the arrays are copy-on-write views of a memory map of the
+    file, so opening a large map costs almost nothing until the data is
+    touched and edits never reach the file. ``mmap=False`` reads everything
+    into memory instead.
+    """
+    header, start = read_header(path)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="c")
+    else:
+        buffer = np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for name, entry in header["arrays"].items():
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        offset = start + entry["offset"]
+        size = dtype.itemsize * int(np.prod(shape))
+        arrays[name] = buffer[offset : offset + size].view(dtype).reshape(shape)
+    values = {name: arrays[name] for name in ARRAYS}
+    for name in POLYGONS:
+        values[name] = Polygons(arrays[name + ".coords"], arrays[name + ".offsets"])
+    return MapData(header["width"], header["height"], **values)
@@ -0,0 +1,358 @@
+"""Rasterization of map data.
+
+Every image MapMaker produces is drawn layer by layer, in :data:`LAYERS`
+order, by :func:`draw_layer`. :class:`LayerCache` keeps each layer as its
+own buffer and composites them, so only changed layers are redrawn between
+renders. Axis-aligned buildings (squares, rectangles
+and L-shapes) are filled by slicing a NumPy coverage mask; only polygons
+and lines go through ImageDraw.
+
+Maps only use the few colors in :data:`PALETTE`, so images can also be
+rendered in palette (``"P"``) mode at one byte per pixel instead of three,
+with exactly the same pixel colors as RGB.
+"""
+
+import json
+import os
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from . import generator as mg
+from .mapdata import L_SHAPE, LAYERS, POLYGON, MapData
+from .spatial import SpatialGrid
+
+DISTRICT_OUTLINE, DISTRICT_OUTLINE_WIDTH = "gray", 2
+ROAD_COLOR, ROAD_WIDTH = "gray", 2
+RIVER_COLOR, RIVER_WIDTH = "blue", 4
+WALL_COLOR, WALL_WIDTH = mg.SHAPE_COLOR, 5
+
+# Color each single-color layer is drawn in.
+LAYER_COLORS = {
+    "buildings": mg.SHAPE_COLOR,
+    "roads": ROAD_COLOR,
+    "rivers": RIVER_COLOR,
+    "walls": WALL_COLOR,
+}
+
+# Extra pixels around a shape's outline covered by its widest stroke.
+STROKE_PAD = 3
+
+# RGB value of every color a map uses; palette images index into it. The
+# background comes first so a new palette image starts out blank.
+PALETTE = list(
+    dict.fromkeys(
+        ImageColor.getrgb(color)
+        for color in (
+            mg.BG_COLOR,
+            mg.SHAPE_COLOR,
+            DISTRICT_OUTLINE,
+            ROAD_COLOR,
+            RIVER_COLOR,
+            WALL_COLOR,
+            *mg.DISTRICT_COLORS,
+        )
+    )
+)
+
+# Compression level of PNG output unless one is given; Pillow's default.
+PNG_COMPRESS_LEVEL = 6
+
+
+def palette_index(color):
+    """Return the :data:`PALETTE` index of a color name or RGB tuple."""
+    if isinstance(color, str):
+        color = ImageColor.getrgb(color)
+    return PALETTE.index(color)
+
+
+def new_image(width, height, palette=False):
+    """Return a blank map image, in palette mode if ``palette`` is set."""
+    if not palette:
+        return Image.new("RGB", (width, height), mg.BG_COLOR)
+    img = Image.new("P", (width, height), palette_index(mg.BG_COLOR))
+    img.putpalette([channel for rgb in PALETTE for channel in rgb])
+    return img
+
+
+def save_image(img, filename, compress_level=None):
+    """Save a rendered map, choosing lossless settings from the extension.
+
+    ``compress_level`` (0-9) trades file size for speed: it is the zlib
+    level of PNG and TIFF files and is scaled to the ``method`` effort of
+    lossless WebP. Formats other than these are saved with Pillow defaults.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    level = PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+    if ext == ".png":
+        img.save(filename, compress_level=level)
+    elif ext == ".webp":
+        # WebP has no palette mode; Pillow converts on save.
+        img.save(filename, lossless=True, method=round(level * 6 / 9))
+    elif ext in (".tif", ".tiff"):
+        img.save(filename, compression="tiff_adobe_deflate", compress_level=level)
+    else:
+        img.save(filename)
+
+
+def l_shape_rects(box):
+    """Return the two inclusive rectangles an L-shaped building is made of."""
+    x1, y1, x2, y2 = box
+    thickness = max(10, min(x2 - x1, y2 - y1) // 3)
+    return (x1, y1, x1 + thickness, y2), (x1, y1, x2, y1 + thickness)
+
+
+def l_shape_outline(box):
+    """Return the outline of an L-shaped building as a polygon."""
+    x1, y1, x2, y2 = box
+    (_, _, inner_x, _), (_, _, _, inner_y) = l_shape_rects(box)
+    return [(x1, y1), (x2, y1), (x2, inner_y), (inner_x, inner_y), (inner_x, y2), (x1, y2)]
+
+
+def _l_shape_arrays(boxes):
+    # Vectorized l_shape_rects over an (n, 4) array.
+    x1, y1, x2, y2 = boxes.T
+    thickness = np.maximum(10, np.minimum(x2 - x1, y2 - y1) // 3)
+    vertical = np.stack([x1, y1, x1 + thickness, y2], axis=1)
+    horizontal = np.stack([x1, y1, x2, y1 + thickness], axis=1)
+    return vertical, horizontal
+
+
+def layer_bounds(data, layer):
+    """Return the pixel boxes the features of ``layer`` may draw into."""
+    bounds = data.bounds(layer).astype(np.int64)
+    if layer == "buildings":
+        lshapes = np.flatnonzero(data.building_types == L_SHAPE)
+        vertical, horizontal = _l_shape_arrays(bounds[lshapes])
+        bounds[lshapes, 2] = np.maximum(bounds[lshapes, 2], vertical[:, 2])
+        bounds[lshapes, 3] = np.maximum(bounds[lshapes, 3], horizontal[:, 3])
+    bounds[:, :2] -= STROKE_PAD
+    bounds[:, 2:] += STROKE_PAD + 1
+    return bounds
+
+
+def _flat_polygons(polygons, ox, oy):
+    """Yield every polygon as a flat ``[x0, y0, x1, y1, ...]`` list."""
+    coords = (polygons.coords.astype(np.int64) - (ox, oy)).ravel().tolist()
+    offsets = polygons.offsets.tolist()
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        yield coords[2 * start : 2 * end]
+
+
+def fill_boxes(pixels, boxes, value, origin=(0, 0)):
+    """Fill inclusive ``(x1, y1, x2, y2)`` boxes of a pixel buffer in place.
+
+    Boxes are given in map coordinates; ``origin`` is the map position of
+    the buffer's top-left pixel. Parts outside the buffer are clipped.
+    """
+    if not len(boxes):
+        return
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    height, width = pixels.shape[:2]
+    ox, oy = origin
+    x1 = np.clip(boxes[:, 0] - ox, 0, width)
+    y1 = np.clip(boxes[:, 1] - oy, 0, height)
+    x2 = np.clip(boxes[:, 2] - ox + 1, 0, width)
+    y2 = np.clip(boxes[:, 3] - oy + 1, 0, height)
+    keep = (x2 > x1) & (y2 > y1)
+    for a, b, c, d in zip(x1[keep].tolist(), y1[keep].tolist(), x2[keep].tolist(), y2[keep].tolist()):
+        pixels[b:d, a:c] = value
+
+
+def draw_layer(img, data, layer, political=True, origin=(0, 0)):
+    """Draw one layer of ``data`` onto ``img`` in place.
+
+    On a bilevel (mode ``"1"``) image every feature is drawn in white, which
+    turns the image into a coverage mask of the layer. On a palette image
+    colors are drawn as their :data:`PALETTE` index.
+    """
+    width, height = img.size
+    ox, oy = origin
+    mode = img.mode
+
+    def ink(color):
+        if mode == "1":
+            return 255
+        if mode == "P":
+            return palette_index(color)
+        return color
+
+    draw = ImageDraw.Draw(img)
+    if layer == "districts":
+        colors = data.district_colors.tolist()
+        for poly, color in zip(_flat_polygons(data.districts, ox, oy), colors):
+            draw.polygon(
+                poly,
+                outline=ink(DISTRICT_OUTLINE),
+                fill=ink(mg.DISTRICT_COLORS[color]) if political else None,
+                width=DISTRICT_OUTLINE_WIDTH,
+            )
+    elif layer == "buildings":
+        types = data.building_types
+        boxes = data.building_boxes
+        lshapes = types == L_SHAPE
+        boxes = np.concatenate([boxes[~lshapes & (types != POLYGON)], *_l_shape_arrays(boxes[lshapes])])
+        if len(boxes):
+            mask = np.zeros((height, width), dtype=np.uint8)
+            fill_boxes(mask, boxes, 255, origin)
+            # A bilevel mask makes paste copy pixels instead of blending them.
+            mask = Image.fromarray(mask, "L").convert("1", dither=0)
+            img.paste(ink(mg.SHAPE_COLOR), (0, 0, width, height), mask)
+            del mask
+        polygons = data.building_polygons.take(np.flatnonzero(types == POLYGON))
+        fill = ink(mg.SHAPE_COLOR)
+        for poly in _flat_polygons(polygons, ox, oy):
+            draw.polygon(poly, fill=fill)
+    elif layer == "walls":
+        for pts in _flat_polygons(data.walls, ox, oy):
+            draw.line(pts + pts[:2], fill=ink(WALL_COLOR), width=WALL_WIDTH)
+    else:
+        color, line_width = (ROAD_COLOR, ROAD_WIDTH) if layer == "roads" else (RIVER_COLOR, RIVER_WIDTH)
+        fill = ink(color)
+        for line in (getattr(data, layer) - np.array([ox, oy, ox, oy])).tolist():
+            draw.line(line, fill=fill, width=line_width)
+
+
+def render_image(data, width, height, political=True, origin=(0, 0), palette=False):
+    """Rasterize map data into a new RGB image.
+
+    ``data`` is a :class:`~mapmaker.mapdata.MapData` or a dictionary in the
+    older list format. ``origin`` is the map position of the image's top-left
+    pixel, which lets callers render any window of a larger map. With
+    ``political`` off, districts are drawn as outlines only. With
+    ``palette`` the image is a ``"P"`` mode image over :data:`PALETTE`
+    instead, with the same pixel colors.
+    """
+    if isinstance(data, dict):
+        data = MapData.from_dict(data, width, height)
+    img = new_image(width, height, palette)
+    for layer in LAYERS:
+        if data.count(layer):
+            draw_layer(img, data, layer, political, origin)
+    return img
+
+
+class LayerCache:
+    """Rendered layers of a map, reused until the layer's data changes.
+
+    Districts, the bottom layer, are kept as an RGB image on the background
+    color, one per political view setting. Every other layer is kept as a
+    bilevel coverage mask that is pasted in its layer color. Entries are
+    keyed by :attr:`MapData.versions <mapmaker.mapdata.MapData>`, so an
+    export after adding a road only redraws the roads and toggling the
+    political view costs a composite.
+
+    ``removed`` maps layer names to indices of features to leave out, such
+    as the features deleted in the editor. Changing them must bump the
+    layer's version with :meth:`MapData.touch <mapmaker.mapdata.MapData.touch>`.
+    """
+
+    def __init__(self):
+        self.data = None
+        self.layers = {}
+
+    def _get(self, key, version, mode, layer, political, removed=None):
+        cached = self.layers.get(key)
+        if cached is None or cached[0] != version:
+            data = self.data
+            gone = removed.get(layer) if removed else None
+            if gone is not None and len(gone):
+                data = data.take({layer: np.setdiff1d(np.arange(data.count(layer)), gone)})
+            img = None
+            if data.count(layer):
+                if mode == "RGB":
+                    img = Image.new(mode, (data.width, data.height), mg.BG_COLOR)
+                else:
+                    img = Image.new(mode, (data.width, data.height))
+                draw_layer(img, data, layer, political)
+                if mode == "1":
+                    # Keep only the part the layer covers; it is pasted there.
+                    box = img.getbbox()
+                    img = (img.crop(box), box) if box else None
+            cached = version, img
+            self.layers[key] = cached
+        return cached[1]
+
+    def _use(self, data):
+        if data is not self.data:
+            self.clear()
+            self.data = data
+
+    def mask(self, data, layer, removed=None):
+        """Return the cached coverage mask of a layer above the districts.
+
+        Returns ``(mask, box)``: a bilevel image of the part of the map
+        ``box`` the layer draws into, or None for an empty layer.
+        """
+        self._use(data)
+        return self._get(layer, (data.versions[layer], (data.width, data.height)), "1", layer, True, removed)
+
+    def render(self, data, political=True, removed=None):
+        """Return ``data`` composited from cached layers as an RGB image."""
+        self._use(data)
+        size = (data.width, data.height)
+        versions = data.versions
+        key = ("districts", political)
+        img = self._get(key, (versions["districts"], size), "RGB", "districts", political, removed)
+        img = img.copy() if img is not None else Image.new("RGB", size, mg.BG_COLOR)
+        for layer in LAYERS[1:]:
+            cached = self.mask(data, layer, removed)
+            if cached is not None:
+                mask, box = cached
+                img.paste(LAYER_COLORS[layer], box, mask)
+        return img
+
+    def clear(self):
+        self.data = None
+        self.layers.clear()
+
+
+def build_index(data, cell_size):
+    """Index the bounds of every feature, in drawing order.
+
+    Returns the ``(layer, index)`` of every indexed item and the index.
+    """
+    items = []
+    index = SpatialGrid(cell_size)
+    for layer in LAYERS:
+        for i, box in enumerate(layer_bounds(data, layer).tolist()):
+            items.append((layer, i))
+            index.insert(box)
+    return items, index
+
+
+def select(data, items, indices):
+    """Return a MapData holding only ``items[i]`` for the given indices."""
+    selection = {layer: [] for layer in LAYERS}
+    for i in indices:
+        layer, index = items[i]
+        selection[layer].append(index)
+    return data.take(selection)
+
+
+def render_tiles(
+    data, width, height, directory, tile_size=1024, political=True, palette=False, compress_level=None
+):
+    """Rasterize ``data`` into PNG tiles under ``directory``.
+
+    Only one tile is held in memory at a time, and each tile only draws the
+    shapes whose bounds touch it. Tiles are named ``{col}_{row}.png`` and
+    listed in a ``manifest.json`` next to them. Returns the manifest.
+    ``palette`` and ``compress_level`` are passed on to
+    :func:`render_image` and :func:`save_image`.
+    """
+    if isinstance(data, dict):
+        data = MapData.from_dict(data, width, height)
+    os.makedirs(directory, exist_ok=True)
+    items, index = build_index(data, tile_size)
+    tiles = []
+    for x1, y1, x2, y2 in mg.split_tiles(width, height, tile_size):
+        subset = select(data, items, index.query((x1, y1, x2, y2)))
+        img = render_image(subset, x2 - x1, y2 - y1, political, origin=(x1, y1), palette=palette)
+        name = f"{x1 // tile_size}_{y1 // tile_size}.png"
+        save_image(img, os.path.join(directory, name), compress_level)
+        tiles.append({"file": name, "x": x1, "y": y1, "width": x2 - x1, "height": y2 - y1})
+    manifest = {"width": width, "height": height, "tile_size": tile_size, "tiles": tiles}
+    with open(os.path.join(directory, "manifest.json"), "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
@@ -1,17 +1,173 @@
 import numpy as np
-from scipy.spatial import Voronoi
+from scipy.spatial import QhullError, Voronoi
+
+
+def clip_segments(segments, width, height):
+    """Clip float segments to the ``[0, width] x [0, height]`` rectangle.
+
+    Vectorized Liang-Barsky over an ``(n, 4)`` array. Returns the clipped
+    segments and the mask of input segments that kept a non-empty part.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    x1, y1, x2, y2 = segments.T
+    dx = x2 - x1
+    dy = y2 - y1
+    p = np.stack([-dx, dx, -dy, dy], axis=1)
+    q = np.stack([x1, width - x1, y1, height - y1], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = q / p
+    entering = p < 0
+    leaving = p > 0
+    t0 = np.where(entering, t, 0.0).max(axis=1)
+    t1 = np.where(leaving, t, 1.0).min(axis=1)
+    # Parallel to an edge and outside of it.
+    outside = ((p == 0) & (q < 0)).any(axis=1)
+    keep = ~outside & (t0 < t1)
+    t0 = t0[keep, None]
+    t1 = t1[keep, None]
+    start = segments[keep, :2]
+    end = segments[keep, 2:]
+    delta = end - start
+    # Unclipped endpoints are kept exactly rather than recomputed.
+    clipped = np.concatenate(
+        [
+            np.where(t0 > 0, start + t0 * delta, start),
+            np.where(t1 < 1, start + t1 * delta, end),
+        ],
+        axis=1,
+    )
+    return clipped, keep
+
+
+def ridge_segments(vor, reach):
+    """Return every ridge of a Voronoi diagram as an ``(n, 4)`` float array.
+
+    Infinite ridges are cut off ``reach`` units past their finite vertex,
+    pointing away from the other side of the diagram.
+    """
+    ridges = np.asarray(vor.ridge_vertices)
+    infinite = (ridges < 0).any(axis=1)
+    segments = np.empty((len(ridges), 4))
+    finite = ~infinite
+    segments[finite, :2] = vor.vertices[ridges[finite, 0]]
+    segments[finite, 2:] = vor.vertices[ridges[finite, 1]]
+    if infinite.any():
+        start = vor.vertices[ridges[infinite].max(axis=1)]
+        pairs = vor.points[vor.ridge_points[infinite]]
+        tangent = pairs[:, 1] - pairs[:, 0]
+        tangent /= np.linalg.norm(tangent, axis=1, keepdims=True)
+        normal = np.stack([-tangent[:, 1], tangent[:, 0]], axis=1)
+        midpoint = pairs.mean(axis=1)
+        side = np.sign(np.einsum("ij,ij->i", midpoint - vor.points.mean(axis=0), normal))
+        side[side == 0] = 1
+        segments[infinite, :2] = start
+        segments[infinite, 2:] = start + normal * side[:, None] * reach
+    return segments
+
+
+def _bisector_segments(points, reach):
+    # Voronoi ridges of points on one line: the perpendicular bisectors of
+    # neighbouring points, which Qhull cannot compute.
+    points = np.unique(np.asarray(points, dtype=float), axis=0)
+    if len(points) < 2:
+        return np.zeros((0, 4))
+    direction = points[-1] - points[0]
+    order = np.argsort(points @ direction)
+    points = points[order]
+    midpoint = (points[1:] + points[:-1]) / 2
+    normal = np.array([-direction[1], direction[0]]) / np.linalg.norm(direction)
+    return np.concatenate([midpoint - normal * reach, midpoint + normal * reach], axis=1)
+
+
+def _voronoi(points, incremental=False):
+    """Return the Voronoi diagram of ``points``, or None if Qhull cannot build one."""
+    points = np.asarray(points, dtype=float)
+    if len(np.unique(points, axis=0)) < 3:
+        return None
+    try:
+        return Voronoi(points, incremental=incremental)
+    except QhullError:
+        # All points on one line.
+        return None
+
+
+def _road_segments(vor, points, width, height):
+    reach = 2.0 * (width + height)
+    if vor is None:
+        segments = _bisector_segments(points, reach)
+    else:
+        # Reach past the canvas from the farthest vertex as well.
+        if len(vor.vertices):
+            reach += np.abs(vor.vertices).max()
+        segments = ridge_segments(vor, reach)
+    clipped, _ = clip_segments(segments, width, height)
+    lines = clipped.astype(np.int32)
+    # Ridges that only touch the canvas collapse to a point.
+    return lines[(lines[:, 0] != lines[:, 2]) | (lines[:, 1] != lines[:, 3])]
 
 
 def generate_road_network(points, width, height):
-    """Generate roads using a Voronoi diagram of the given points."""
-    vor = Voronoi(points)
-    lines = []
-    for vpair in vor.ridge_vertices:
-        if -1 in vpair:
-            continue
-        p1 = vor.vertices[vpair[0]]
-        p2 = vor.vertices[vpair[1]]
-        if 0 <= p1[0] <= width and 0 <= p1[1] <= height and 0 <= p2[0] <= width and 0 <= p2[1] <= height:
-            lines.append((int(p1[0]), int(p1[1]), int(p2[0]), int(p2[1])))
-    return lines
+    """Generate roads using a Voronoi diagram of the given points.
+
+    Returns an ``(n, 4)`` int32 array of ``x1, y1, x2, y2`` segments clipped
+    to the canvas, including the ridges running off to infinity. Earlier
+    versions returned a list of tuples; check for roads with ``len()``.
+    """
+    if not len(points):
+        return np.zeros((0, 4), dtype=np.int32)
+    return _road_segments(_voronoi(points), points, width, height)
+
+
+class RoadNetwork:
+    """Voronoi road network that grows as control points are added.
+
+    Points are inserted into the existing Qhull triangulation instead of
+    rebuilding it from scratch, and the clipped segments are reused until
+    the points or the canvas size change.
+    """
+
+    def __init__(self, points=()):
+        self.points = []
+        self.vor = None
+        self._segments = None  # ((point count, width, height), segments)
+        self.add_points(points)
+
+    def add_points(self, points):
+        """Add control points to the diagram."""
+        points = [tuple(p) for p in points]
+        if not points:
+            return
+        self.points.extend(points)
+        if self.vor is not None:
+            self.vor.add_points(np.asarray(points, dtype=float))
+        else:
+            # Qhull needs a few points off a single line to start from.
+            self.vor = _voronoi(self.points, incremental=True)
+
+    def update(self, points):
+        """Make the control points equal to ``points``.
+
+        Points appended after the current ones are added incrementally;
+        any other change rebuilds the diagram.
+        """
+        points = [tuple(p) for p in points]
+        if points[: len(self.points)] != self.points:
+            self.close()
+            self.points = []
+            self._segments = None
+        self.add_points(points[len(self.points) :])
+
+    def segments(self, width, height):
+        """Return the road segments clipped to a ``width`` x ``height`` canvas."""
+        if not self.points:
+            return np.zeros((0, 4), dtype=np.int32)
+        key = (len(self.points), width, height)
+        if self._segments is None or self._segments[0] != key:
+            self._segments = key, _road_segments(self.vor, self.points, width, height)
+        return self._segments[1].copy()
 
+    def close(self):
+        """Free the Qhull state of the diagram."""
+        if self.vor is not None:
+            self.vor.close()
+            self.vor = None
@@ -0,0 +1,212 @@
+"""Serve a map as XYZ image tiles over HTTP.
+
+Tiles are addressed as ``/{z}/{x}/{y}.png`` like web map tiles. Zoom level
+:attr:`TileRenderer.max_zoom` shows the map at its own resolution and every
+level below halves it, down to a reduction of :data:`MAX_REDUCTION`. Tiles
+are only rendered when requested, in a thread pool, and the encoded PNGs are
+kept in a size-bounded LRU cache. ``/metadata.json`` describes the pyramid.
+
+Only the standard library and the renderer's own dependencies are used::
+
+    python generate.py --preset 8k --num-shapes 20000 --seed 1 --serve 8000
+"""
+
+import io
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .render import build_index, new_image, render_image, select
+
+TILE_SIZE = 256
+# Lowest zoom levels render this many map pixels into one tile pixel at most,
+# which bounds the area drawn for a single tile.
+MAX_REDUCTION = 32
+CACHE_BYTES = 64 << 20
+
+TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+
+class TileCache:
+    """Thread-safe LRU cache of encoded tiles, bounded by their total size."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._tiles:
+                self.nbytes -= len(self._tiles.pop(key))
+            if len(tile) > self.max_bytes:
+                return
+            self._tiles[key] = tile
+            self.nbytes += len(tile)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+
+class TileRenderer:
+    """Render and cache the XYZ tiles of one map.
+
+    Concurrent requests for a tile that is still being rendered wait for
+    that render instead of starting another one. With ``palette`` tiles at
+    the full resolution are rendered and encoded as palette images; reduced
+    tiles are averaged in RGB.
+    """
+
+    def __init__(
+        self, data, tile_size=TILE_SIZE, cache_bytes=CACHE_BYTES, workers=None, compress_level=None, palette=False
+    ):
+        self.data = data
+        self.tile_size = tile_size
+        self.compress_level = compress_level
+        self.palette = palette
+        self.max_zoom = max(0, math.ceil(math.log2(max(data.width, data.height) / tile_size)))
+        self.min_zoom = max(0, self.max_zoom - int(math.log2(MAX_REDUCTION)))
+        self.cache = TileCache(cache_bytes)
+        self.items, self.index = build_index(data, tile_size)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def metadata(self):
+        """Return the tile pyramid layout as a JSON-friendly dict."""
+        return {
+            "width": self.data.width,
+            "height": self.data.height,
+            "tile_size": self.tile_size,
+            "min_zoom": self.min_zoom,
+            "max_zoom": self.max_zoom,
+        }
+
+    def span(self, z):
+        """Return how many map pixels one tile covers per side at zoom ``z``."""
+        return self.tile_size << (self.max_zoom - z)
+
+    def contains(self, z, x, y):
+        if not self.min_zoom <= z <= self.max_zoom:
+            return False
+        span = self.span(z)
+        return x * span < self.data.width and y * span < self.data.height
+
+    def tile(self, z, x, y):
+        """Return tile ``z/x/y`` as PNG bytes, or None outside the map."""
+        if not self.contains(z, x, y):
+            return None
+        key = (z, x, y)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pool.submit(self._render, key)
+                self._pending[key] = future
+        return future.result()
+
+    def _render(self, key):
+        try:
+            tile = self.render_tile(*key)
+            self.cache.put(key, tile)
+            return tile
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def render_tile(self, z, x, y):
+        """Render tile ``z/x/y`` without the cache and return it as PNG bytes."""
+        data = self.data
+        span = self.span(z)
+        x1, y1 = x * span, y * span
+        width = min(span, data.width - x1)
+        height = min(span, data.height - y1)
+        subset = select(data, self.items, self.index.query((x1, y1, x1 + width, y1 + height)))
+        reduction = span // self.tile_size
+        palette = self.palette and reduction == 1
+        img = render_image(subset, width, height, origin=(x1, y1), palette=palette)
+        if reduction > 1:
+            img = img.reduce(reduction)
+        if img.size != (self.tile_size, self.tile_size):
+            # Tiles on the right and bottom edge are padded with background.
+            tile = new_image(self.tile_size, self.tile_size, palette)
+            tile.paste(img, (0, 0))
+            img = tile
+        buffer = io.BytesIO()
+        if self.compress_level is None:
+            img.save(buffer, "PNG")
+        else:
+            img.save(buffer, "PNG", compress_level=self.compress_level)
+        return buffer.getvalue()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def make_handler(renderer):
+    """Return a request handler class serving ``renderer``'s tiles."""
+
+    class TileHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metadata.json":
+                self._send(200, "application/json", json.dumps(renderer.metadata()).encode())
+                return
+            match = TILE_PATH.match(path)
+            tile = renderer.tile(*map(int, match.groups())) if match else None
+            if tile is None:
+                self.send_error(404)
+                return
+            self._send(200, "image/png", tile)
+
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+    return TileHandler
+
+
+def serve(data, port=8000, host="127.0.0.1", **options):
+    """Serve the tiles of ``data`` until interrupted.
+
+    ``options`` are passed to :class:`TileRenderer`.
+    """
+    renderer = TileRenderer(data, **options)
+    server = ThreadingHTTPServer((host, port), make_handler(renderer))
+    print(
+        f"Serving {data.width}x{data.height} map tiles at http://{host}:{server.server_port}/{{z}}/{{x}}/{{y}}.png "
+        f"(zoom {renderer.min_zoom}-{renderer.max_zoom})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        renderer.close()
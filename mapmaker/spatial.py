@@ -0,0 +1,162 @@
+"""Spatial indexing helpers for fast overlap queries."""
+
+from array import array
+
+
+class SpatialGrid:
+    """Uniform grid of buckets holding axis-aligned boxes.
+
+    Boxes are ``(x1, y1, x2, y2)`` tuples. Each box is stored in every cell
+    it covers, so an overlap query only has to look at the boxes sharing a
+    cell with the query box instead of scanning everything inserted so far.
+    Overlap uses the same semantics as :func:`mapmaker.generator.intersects`:
+    boxes that merely touch along an edge do not overlap.
+    """
+
+    def __init__(self, cell_size=128):
+        self.cell_size = max(1, int(cell_size))
+        self.boxes = []
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cells(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        for cx in range(int(x1) // size, int(x2) // size + 1):
+            for cy in range(int(y1) // size, int(y2) // size + 1):
+                yield cx, cy
+
+    def insert(self, box):
+        """Add ``box`` to the index and return its position."""
+        index = len(self.boxes)
+        self.boxes.append(box)
+        for key in self._cells(box):
+            bucket = self.cells.get(key)
+            if bucket is None:
+                self.cells[key] = [index]
+            else:
+                bucket.append(index)
+        return index
+
+    def remove(self, index):
+        """Take box ``index`` out of the grid so queries no longer find it."""
+        for key in self._cells(self.boxes[index]):
+            self.cells[key].remove(index)
+        self.boxes[index] = None
+
+    def move(self, index, box):
+        """Replace box ``index``, or put a removed one back, keeping its position."""
+        if self.boxes[index] is not None:
+            self.remove(index)
+        self.boxes[index] = box
+        for key in self._cells(box):
+            self.cells.setdefault(key, []).append(index)
+
+    def query(self, box):
+        """Return the indices of stored boxes overlapping ``box``."""
+        ax1, ay1, ax2, ay2 = box
+        boxes = self.boxes
+        found = set()
+        for key in self._cells(box):
+            for index in self.cells.get(key, ()):
+                if index in found:
+                    continue
+                bx1, by1, bx2, by2 = boxes[index]
+                if not (ax2 <= bx1 or ax1 >= bx2 or ay2 <= by1 or ay1 >= by2):
+                    found.add(index)
+        return sorted(found)
+
+    def intersects_any(self, box):
+        """Return True if ``box`` overlaps any stored box."""
+        ax1, ay1, ax2, ay2 = box
+        boxes = self.boxes
+        cells = self.cells
+        for key in self._cells(box):
+            for index in cells.get(key, ()):
+                bx1, by1, bx2, by2 = boxes[index]
+                if not (ax2 <= bx1 or ax1 >= bx2 or ay2 <= by1 or ay1 >= by2):
+                    return True
+        return False
+
+
+class FreeSpaceMap:
+    """Occupancy bitmap of the cells that can still anchor a new box.
+
+    The canvas is divided into ``cell_size`` squares of possible top-left
+    corners. A cell is retired once a placed box makes every anchor in it
+    unusable for a box of at least ``min_size`` pixels, or once ``retries``
+    candidates sampled from it have been rejected. When no cells are left
+    the canvas is considered saturated.
+    """
+
+    def __init__(self, width, height, min_size, cell_size=8, retries=4):
+        self.width = width
+        self.height = height
+        self.min_size = min_size
+        self.cell_size = max(1, int(cell_size))
+        self.retries = retries
+        self.cols = max(0, (width - min_size) // self.cell_size + 1)
+        self.rows = max(0, (height - min_size) // self.cell_size + 1)
+        count = self.cols * self.rows
+        # Compact int32 arrays rather than lists: a large canvas has
+        # hundreds of millions of cells.
+        self.live = array("i", range(count))
+        self.slot = self.live[:]
+        self.failures = bytearray(count)
+
+    @property
+    def saturated(self):
+        return not self.live
+
+    def __len__(self):
+        return len(self.live)
+
+    def _retire(self, cell):
+        pos = self.slot[cell]
+        if pos < 0:
+            return
+        last = self.live.pop()
+        if last != cell:
+            self.live[pos] = last
+            self.slot[last] = pos
+        self.slot[cell] = -1
+
+    def sample(self, rng, w, h):
+        """Return ``(cell, x, y)`` for a box of size ``w`` x ``h``.
+
+        ``x`` and ``y`` are None when the box cannot fit inside the canvas
+        from the chosen cell.
+        """
+        cell = self.live[rng.randrange(len(self.live))]
+        cy, cx = divmod(cell, self.cols)
+        size = self.cell_size
+        x0 = cx * size
+        y0 = cy * size
+        x1 = min(x0 + size - 1, self.width - w)
+        y1 = min(y0 + size - 1, self.height - h)
+        if x1 < x0 or y1 < y0:
+            return cell, None, None
+        return cell, rng.randint(x0, x1), rng.randint(y0, y1)
+
+    def reject(self, cell):
+        """Record a rejected candidate anchored in ``cell``."""
+        self.failures[cell] += 1
+        if self.failures[cell] >= self.retries:
+            self._retire(cell)
+
+    def occupy(self, box):
+        """Retire every cell whose anchors all overlap ``box``."""
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        # Anchors less than min_size left of or above the box cannot hold
+        # even the smallest box without overlapping it.
+        cx_start = max(0, -(-(x1 - self.min_size + 1) // size))
+        cy_start = max(0, -(-(y1 - self.min_size + 1) // size))
+        cx_end = min(self.cols - 1, (x2 - size) // size)
+        cy_end = min(self.rows - 1, (y2 - size) // size)
+        for cy in range(cy_start, cy_end + 1):
+            row = cy * self.cols
+            for cx in range(cx_start, cx_end + 1):
+                self._retire(row + cx)
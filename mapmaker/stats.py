@@ -0,0 +1,65 @@
+"""Per-stage timing and placement counters of a map generation run."""
+
+import time
+from contextlib import contextmanager
+
+
+class GenerationStats:
+    """Collects wall time and counters per stage.
+
+    Pass an instance as ``stats`` to :func:`mapmaker.generator.draw_map`,
+    :func:`mapmaker.generator.generate_map_data` or the layer generators.
+    Every stage gets a record with its ``seconds`` plus the counters the
+    stage reports, such as ``requested``/``placed`` shapes and candidate
+    ``attempts``/``rejected`` during placement.
+
+    ``hook`` is called as ``hook(stage, record)`` whenever a timed stage
+    finishes, so library users can log or aggregate as the map is built.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.stages = {}
+
+    def record(self, stage):
+        """Return the record of ``stage``, creating it if needed."""
+        return self.stages.setdefault(stage, {"seconds": 0.0})
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the body of a ``with`` block as ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield self.record(stage)
+        finally:
+            record = self.record(stage)
+            record["seconds"] += time.perf_counter() - start
+            if self.hook is not None:
+                self.hook(stage, record)
+
+    def count(self, stage, **counters):
+        """Add ``counters`` to the record of ``stage``."""
+        record = self.record(stage)
+        for name, value in counters.items():
+            record[name] = record.get(name, 0) + value
+
+    @property
+    def total_seconds(self):
+        return sum(record["seconds"] for record in self.stages.values())
+
+    def to_dict(self):
+        """Return a JSON-friendly copy of the collected stats."""
+        stages = {}
+        for stage, record in self.stages.items():
+            stages[stage] = dict(record, seconds=round(record["seconds"], 6))
+        return {"total_seconds": round(self.total_seconds, 6), "stages": stages}
+
+
+@contextmanager
+def timed(stats, stage):
+    """Like :meth:`GenerationStats.stage`, but does nothing for ``stats=None``."""
+    if stats is None:
+        yield None
+    else:
+        with stats.stage(stage) as record:
+            yield record
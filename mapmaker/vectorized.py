@@ -0,0 +1,292 @@
+"""NumPy batch generation of buildings, districts and polygons.
+
+Candidates are drawn in blocks of arrays and tested for overlap in one go.
+Only candidates that collide with another candidate of the same block are
+resolved one at a time, in draw order.
+"""
+
+import math
+import random
+
+import numpy as np
+
+from .mapdata import POLYGON, SHAPE_TYPES, SQUARE
+
+# Cell size of the corner grid holding accepted buildings. It must be at least
+# as large as the biggest building so only the 3x3 neighbouring cells of a
+# candidate can hold boxes overlapping it.
+CORNER_CELL_SIZE = 128
+
+# Once the canvas fills up, placement keeps trying ``max_attempts``
+# candidates per building still missing, but for no more than this many
+# buildings at a time, so saturated canvases still finish quickly.
+MISSING_BUDGET = 32
+
+
+def numpy_rng(seed=None):
+    """Return a NumPy generator for ``seed``.
+
+    Without a seed the generator is seeded from the global ``random`` state so
+    ``random.seed()`` keeps runs reproducible.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        seed = random.getrandbits(64)
+    return np.random.default_rng(seed)
+
+
+def overlaps(a, b):
+    """Broadcast box overlap test between ``(..., 4)`` arrays."""
+    return ~(
+        (a[..., 2] <= b[..., 0])
+        | (a[..., 0] >= b[..., 2])
+        | (a[..., 3] <= b[..., 1])
+        | (a[..., 1] >= b[..., 3])
+    )
+
+
+def resolve_block(boxes, conflict):
+    """Return the mask of candidates accepted from one block.
+
+    ``conflict`` marks candidates already rejected against earlier blocks.
+    The remaining candidates that do not touch each other are accepted
+    directly; the rest are settled in draw order so earlier ones win.
+    """
+    accepted = ~conflict
+    idx = np.flatnonzero(accepted)
+    if len(idx) < 2:
+        return accepted
+    pair = overlaps(boxes[idx, None, :], boxes[None, idx, :])
+    np.fill_diagonal(pair, False)
+    clashing = np.flatnonzero(pair.any(axis=1))
+    kept = []
+    for i in clashing:
+        if kept and pair[i, kept].any():
+            accepted[idx[i]] = False
+        else:
+            kept.append(i)
+    return accepted
+
+
+class CornerGrid:
+    """Accepted boxes bucketed by the cell of their top-left corner."""
+
+    def __init__(self, width, height, min_size, cell_size=CORNER_CELL_SIZE):
+        self.cell_size = cell_size
+        cols = width // cell_size + 1
+        rows = height // cell_size + 1
+        # Non-overlapping boxes of at least min_size pixels can only have
+        # this many top-left corners inside one cell.
+        per_axis = math.ceil(cell_size / min_size)
+        capacity = per_axis * per_axis
+        # One cell of padding on every side avoids clipping neighbour lookups.
+        self.slots = np.zeros((rows + 2, cols + 2, capacity, 4), dtype=np.int32)
+        self.counts = np.zeros((rows + 2, cols + 2), dtype=np.int32)
+        self._capacity = np.arange(capacity)
+        offsets = np.array([(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+        self._dy = offsets[:, 0]
+        self._dx = offsets[:, 1]
+
+    def _cells(self, boxes):
+        gx = boxes[:, 0] // self.cell_size + 1
+        gy = boxes[:, 1] // self.cell_size + 1
+        return gy, gx
+
+    def conflicts(self, boxes):
+        """Return a mask of ``boxes`` overlapping any stored box."""
+        if not len(boxes):
+            return np.zeros(0, dtype=bool)
+        gy, gx = self._cells(boxes)
+        ny = gy[:, None] + self._dy
+        nx = gx[:, None] + self._dx
+        counts = self.counts[ny, nx]
+        # Only look at as many slots as the fullest neighbouring cell uses.
+        depth = int(counts.max()) if counts.size else 0
+        stored = self.slots[ny, nx, :depth]
+        valid = self._capacity[:depth] < counts[..., None]
+        hit = overlaps(boxes[:, None, None, :], stored) & valid
+        return hit.reshape(len(boxes), -1).any(axis=1)
+
+    def insert(self, boxes):
+        """Store ``boxes``, which must not overlap each other."""
+        if not len(boxes):
+            return
+        gy, gx = self._cells(boxes)
+        flat = gy * self.counts.shape[1] + gx
+        order = np.argsort(flat, kind="stable")
+        flat = flat[order]
+        starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+        rank = np.arange(len(flat)) - np.repeat(starts, np.diff(np.r_[starts, len(flat)]))
+        gy = gy[order]
+        gx = gx[order]
+        self.slots[gy, gx, self.counts[gy, gx] + rank] = boxes[order]
+        np.add.at(self.counts, (gy, gx), 1)
+
+
+def random_polygons_from_boxes(boxes, rng, min_vertices=3, max_vertices=6):
+    """Create one random polygon inside each box.
+
+    Returns ``(coords, offsets)``: the vertices of polygon ``i`` are
+    ``coords[offsets[i]:offsets[i + 1]]``.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    counts = rng.integers(min_vertices, max_vertices, size=len(boxes), endpoint=True)
+    offsets = np.zeros(len(boxes) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    owner = np.repeat(np.arange(len(boxes)), counts)
+    owned = boxes[owner]
+    px = rng.integers(owned[:, 0], owned[:, 2], endpoint=True)
+    py = rng.integers(owned[:, 1], owned[:, 3], endpoint=True)
+    coords = np.stack([px, py], axis=1).astype(np.int32)
+    return coords, offsets
+
+
+def irregular_polygons(cx, cy, radius, rng, irregularity=0.3, spikeyness=0.2, num_vertices=8):
+    """Generate one irregular polygon around each center point.
+
+    Vectorized counterpart of
+    :func:`mapmaker.generator.generate_irregular_polygon`; returns an int
+    array of shape ``(len(cx), num_vertices, 2)``.
+    """
+    cx = np.asarray(cx, dtype=float).reshape(-1)
+    cy = np.asarray(cy, dtype=float).reshape(-1)
+    count = len(cx)
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (count,))
+    irregularity = max(0, min(irregularity, 1)) * 2 * math.pi / num_vertices
+    spikeyness = max(0, min(spikeyness, 1)) * radius
+
+    step = 2 * math.pi / num_vertices
+    steps = rng.uniform(step - irregularity, step + irregularity, size=(count, num_vertices))
+    steps /= steps.sum(axis=1, keepdims=True) / (2 * math.pi)
+    angles = np.empty_like(steps)
+    angles[:, 0] = rng.uniform(0, 2 * math.pi, size=count)
+    angles[:, 1:] = angles[:, :1] + np.cumsum(steps[:, :-1], axis=1)
+
+    r = rng.normal(radius[:, None], spikeyness[:, None], size=(count, num_vertices))
+    np.maximum(r, 5, out=r)
+    points = np.empty((count, num_vertices, 2), dtype=np.int64)
+    points[..., 0] = cx[:, None] + r * np.cos(angles)
+    points[..., 1] = cy[:, None] + r * np.sin(angles)
+    return points
+
+
+def generate_buildings(
+    width,
+    height,
+    num_shapes=10,
+    max_attempts=1000,
+    rng=None,
+    block_size=1024,
+    min_size=20,
+    progress=None,
+    stats=None,
+):
+    """Place up to ``num_shapes`` non-overlapping buildings in blocks.
+
+    Like the per-building loop, every building still missing gets
+    ``max_attempts`` candidates, for up to :data:`MISSING_BUDGET` of them at
+    once: generation stops when that many candidates in a row were rejected.
+    Returns ``(types, boxes, coords, offsets)`` where ``types`` are indices
+    into :data:`SHAPE_TYPES`, ``boxes`` is an ``(n, 4)`` array and
+    ``coords``/``offsets`` hold the vertices of the polygon buildings in
+    order (see :func:`random_polygons_from_boxes`). ``progress`` is called
+    with the fraction placed so far after every block. ``stats`` receives
+    the ``"buildings"`` counters (see :mod:`mapmaker.stats`); every drawn
+    candidate that fits the canvas counts as an attempt.
+    """
+    rng = numpy_rng(rng)
+    grid = CornerGrid(width, height, min_size)
+    kept_types = []
+    kept_boxes = []
+    placed = 0
+    misses = 0
+    attempts = 0
+    # Candidates that don't fit the canvas are not counted as misses, so a
+    # canvas too small for any building must not be tried at all.
+    fits_canvas = width >= min_size and height >= min_size
+    while fits_canvas and placed < num_shapes:
+        if misses >= max_attempts * min(num_shapes - placed, MISSING_BUDGET):
+            break
+        if progress is not None:
+            progress(placed / num_shapes)
+        types = rng.integers(0, len(SHAPE_TYPES), size=block_size)
+        side = rng.integers(min_size, 100, size=block_size, endpoint=True)
+        w = rng.integers(30, 120, size=block_size, endpoint=True)
+        h = rng.integers(30, 120, size=block_size, endpoint=True)
+        square = types == SQUARE
+        w[square] = side[square]
+        h[square] = side[square]
+        fits = (w <= width) & (h <= height)
+        x = (rng.random(block_size) * (width - w + 1)).astype(np.int64)
+        y = (rng.random(block_size) * (height - h + 1)).astype(np.int64)
+        boxes = np.stack([x, y, x + w, y + h], axis=1)[fits]
+        types = types[fits]
+
+        accepted = resolve_block(boxes, grid.conflicts(boxes))
+        hits = np.flatnonzero(accepted)[: num_shapes - placed]
+        if len(hits):
+            # Candidates after the last accepted one are left untested once
+            # the quota is met; otherwise they count as misses.
+            attempts += hits[-1] + 1 if placed + len(hits) == num_shapes else len(boxes)
+            misses = len(boxes) - 1 - hits[-1]
+            grid.insert(boxes[hits])
+            kept_types.append(types[hits])
+            kept_boxes.append(boxes[hits])
+            placed += len(hits)
+        else:
+            attempts += len(boxes)
+            misses += len(boxes)
+
+    types = np.concatenate(kept_types) if kept_types else np.zeros(0, dtype=np.int64)
+    boxes = np.concatenate(kept_boxes) if kept_boxes else np.zeros((0, 4), dtype=np.int64)
+    coords, offsets = random_polygons_from_boxes(boxes[types == POLYGON], rng)
+    if stats is not None:
+        attempts = int(attempts)
+        stats.count("buildings", requested=num_shapes, placed=placed, attempts=attempts, rejected=attempts - placed)
+    return types.astype(np.uint8), boxes.astype(np.int32), coords, offsets
+
+
+def generate_districts(width, height, count, max_attempts=1000, rng=None, block_size=64, stats=None):
+    """Place up to ``count`` non-overlapping irregular districts in blocks.
+
+    Returns ``(polys, colors)``: an ``(n, vertices, 2)`` array of polygons and
+    the random palette slot (0-5) drawn for each of them. ``stats`` receives
+    the ``"districts"`` counters.
+    """
+    rng = numpy_rng(rng)
+    lo = min(width, height) // 8
+    hi = min(width, height) // 3
+    polys = []
+    colors = []
+    bounds = np.zeros((0, 4), dtype=np.int64)
+    failures = 0
+    while len(polys) < count and failures < max_attempts:
+        radius = rng.integers(lo, hi, size=block_size, endpoint=True)
+        cx = rng.integers(radius, width - radius, endpoint=True)
+        cy = rng.integers(radius, height - radius, endpoint=True)
+        shapes = irregular_polygons(cx, cy, radius, rng)
+        palette = rng.integers(0, 6, size=block_size)
+        boxes = np.concatenate([shapes.min(axis=1), shapes.max(axis=1)], axis=1)
+        conflict = overlaps(boxes[:, None, :], bounds[None, :, :]).any(axis=1)
+        accepted = resolve_block(boxes, conflict)
+        for i in range(block_size):
+            if len(polys) >= count or failures >= max_attempts:
+                break
+            if accepted[i]:
+                polys.append(shapes[i])
+                colors.append(palette[i])
+                bounds = np.vstack([bounds, boxes[i : i + 1]])
+            else:
+                failures += 1
+    if stats is not None:
+        stats.count(
+            "districts",
+            requested=count,
+            placed=len(polys),
+            attempts=len(polys) + failures,
+            rejected=failures,
+        )
+    if not polys:
+        return np.zeros((0, 0, 2), dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    return np.array(polys, dtype=np.int64), np.array(colors, dtype=np.uint8)